@@ -5,4 +5,9 @@ DELETE_TASK         = "/tasks/delete_task"
 ORDER_TASKS         = "/tasks/order_task"
 REGISTER_USER       = "/tasks/register_user"
 VALIDATE_OTP        = "/tasks/verify_otp"
-GENERATE_OTP        = "/tasks/generate_otp"
\ No newline at end of file
+GENERATE_OTP        = "/tasks/generate_otp"
+TASK_SUMMARY        = "/tasks/task_summary"
+TASK_FEED           = "/tasks/task_feed"
+QUERY_METRICS       = "/tasks/query_metrics"
+EXPORT_TASKS        = "/tasks/export_task"
+BATCH_TASKS         = "/tasks/batch_task"
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from leader import build_leader_lock
+from storage import storage
+import config
+
+
+class TaskArchiver:
+    """
+    Moves old Done tasks into tasks_archive. Only the worker holding
+    leader_lock archives, so batches from different workers never contend
+    for the same rows.
+    """
+
+    def __init__(self, after_days, batch_size, interval, leader_lock):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.leader_lock = leader_lock
+        self._task = None
+
+    async def archive_batch(self):
+        return await storage.tasks.archive_done(self.after_days, self.batch_size)
+
+    async def archive_all(self):
+        total = 0
+        while True:
+            moved = await self.archive_batch()
+            total += moved
+            if moved < self.batch_size:
+                break
+
+            # Give user traffic a turn between batches
+            await asyncio.sleep(0)
+
+        if total:
+            logging.info(f"Archived {total} done tasks older than {self.after_days} days")
+        return total
+
+    async def run(self):
+        while True:
+            try:
+                if await self.leader_lock.ensure():
+                    await self.archive_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error archiving tasks: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.leader_lock.release()
+
+
+task_archiver = TaskArchiver(
+    config.ARCHIVE_AFTER_DAYS, config.ARCHIVE_BATCH_SIZE, config.ARCHIVE_INTERVAL_SECONDS,
+    build_leader_lock(config.ARCHIVE_LOCK_KEY)
+)
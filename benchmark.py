@@ -0,0 +1,58 @@
+import asyncio
+import datetime as dt
+import os
+import time
+
+# Measure the application layer on its own: routing, auth, validation and
+# serialization against the in-memory engine, with no database time mixed in.
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+
+import httpx
+from main import app
+from helpers import create_token
+from storage import storage
+
+USERS = 100
+TASKS_PER_USER = 200
+REQUESTS = 2000
+
+
+def seed():
+    today = dt.date.today()
+    statuses = ['To Do', 'In Progress', 'Done']
+    tasks = [
+        {
+            'task_id'   : user_id * TASKS_PER_USER + n,
+            'title'     : f"Task {n}",
+            'status'    : statuses[n % len(statuses)],
+            'due_date'  : today + dt.timedelta(days=n % 60),
+            'user_id'   : user_id
+        }
+        for user_id in range(1, USERS + 1)
+        for n in range(TASKS_PER_USER)
+    ]
+    storage.tasks.engine.load(tasks=tasks)
+
+
+async def bench(client, name, method, path, token, **kwargs):
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        response = await client.request(method, path, headers={'authorization': token}, **kwargs)
+        assert response.status_code == 200, response.text
+    elapsed = time.perf_counter() - started
+    print(f"{name:<14} {REQUESTS / elapsed:>10.0f} req/s {elapsed / REQUESTS * 1e6:>10.0f} us/req")
+
+
+async def main():
+    seed()
+    token = await create_token(1)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await bench(client, "task_list", "GET", "/tasks/task_list", token)
+        await bench(client, "task_list?s", "GET", "/tasks/task_list", token, params={'status': 'To Do'})
+        await bench(client, "order_task", "GET", "/tasks/order_task", token)
+        await bench(client, "task_summary", "GET", "/tasks/task_summary", token)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
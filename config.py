@@ -1,7 +1,89 @@
 from decouple import config
 
-PG_NAME     =   config('PG_DATABASE')
-PG_USER     =   config('PG_USER')
-PG_PASSWORD =   config('PG_PASSWORD')
-PG_HOST     =   config('PG_HOST')
-PG_PORT     =   config('PG_PORT')
\ No newline at end of file
+# Storage backend: 'postgres', or 'memory' to run without a database
+STORAGE_BACKEND = config('STORAGE_BACKEND', default='postgres')
+
+PG_NAME     =   config('PG_DATABASE', default=None)
+PG_USER     =   config('PG_USER', default=None)
+PG_PASSWORD =   config('PG_PASSWORD', default=None)
+PG_HOST     =   config('PG_HOST', default=None)
+PG_PORT     =   config('PG_PORT', default=None)
+
+# Window (in days) counted as "due soon" by the task summary
+DUE_SOON_DAYS = config('DUE_SOON_DAYS', default=3, cast=int)
+
+# Live task feed: events buffered per subscriber before it is told to resync,
+# and seconds between keep-alive comments on an idle stream
+FEED_BUFFER_SIZE        = config('FEED_BUFFER_SIZE', default=100, cast=int)
+FEED_HEARTBEAT_SECONDS  = config('FEED_HEARTBEAT_SECONDS', default=15, cast=float)
+FEED_RECONNECT_SECONDS  = config('FEED_RECONNECT_SECONDS', default=5, cast=float)
+
+# OTP delivery queue. 'memory' runs the worker inside the API process;
+# 'nats' publishes to JetStream for a separate `python otp_delivery.py` worker
+OTP_BROKER          = config('OTP_BROKER', default='memory')
+OTP_RUN_WORKER      = config('OTP_RUN_WORKER', default=True, cast=bool)
+OTP_BATCH_SIZE      = config('OTP_BATCH_SIZE', default=50, cast=int)
+OTP_POLL_TIMEOUT    = config('OTP_POLL_TIMEOUT', default=1, cast=float)
+NATS_URL            = config('NATS_URL', default='nats://127.0.0.1:4222')
+NATS_OTP_STREAM     = config('NATS_OTP_STREAM', default='OTP')
+NATS_OTP_DURABLE    = config('NATS_OTP_DURABLE', default='otp-delivery')
+
+# Backoff after a failed delivery batch: OTP_RETRY_DELAY seconds, doubling on
+# each consecutive failure up to OTP_RETRY_MAX_DELAY
+OTP_RETRY_DELAY     = config('OTP_RETRY_DELAY', default=1, cast=float)
+OTP_RETRY_MAX_DELAY = config('OTP_RETRY_MAX_DELAY', default=60, cast=float)
+
+# Archival of finished tasks into tasks_archive
+ARCHIVE_ENABLED             = config('ARCHIVE_ENABLED', default=True, cast=bool)
+ARCHIVE_AFTER_DAYS          = config('ARCHIVE_AFTER_DAYS', default=30, cast=int)
+ARCHIVE_BATCH_SIZE          = config('ARCHIVE_BATCH_SIZE', default=500, cast=int)
+ARCHIVE_INTERVAL_SECONDS    = config('ARCHIVE_INTERVAL_SECONDS', default=3600, cast=float)
+ARCHIVE_LOCK_KEY            = config('ARCHIVE_LOCK_KEY', default=7202, cast=int)
+
+# Load shedding. POOL_ACQUIRE_TIMEOUT bounds the wait for a pool connection,
+# STATEMENT_TIMEOUT is the server-side default for every statement and
+# STATEMENT_TIMEOUTS tightens it per endpoint. Requests that hit either get
+# a 503 with Retry-After: RETRY_AFTER_SECONDS.
+POOL_ACQUIRE_TIMEOUT    = config('POOL_ACQUIRE_TIMEOUT', default=1, cast=float)
+STATEMENT_TIMEOUT       = config('STATEMENT_TIMEOUT', default=30, cast=float)
+RETRY_AFTER_SECONDS     = config('RETRY_AFTER_SECONDS', default=2, cast=int)
+DISCONNECT_POLL_SECONDS = config('DISCONNECT_POLL_SECONDS', default=0.25, cast=float)
+
+STATEMENT_TIMEOUTS = {
+    'list_tasks'    : config('LIST_TASKS_TIMEOUT', default=3, cast=float),
+    'batch_tasks'   : config('BATCH_TASKS_TIMEOUT', default=2, cast=float),
+    'order_tasks'   : config('ORDER_TASKS_TIMEOUT', default=3, cast=float),
+    'task_summary'  : config('TASK_SUMMARY_TIMEOUT', default=1, cast=float),
+    'write_task'    : config('WRITE_TASK_TIMEOUT', default=2, cast=float),
+    'auth'          : config('AUTH_TIMEOUT', default=2, cast=float),
+    'export'        : config('EXPORT_TIMEOUT', default=600, cast=float)
+}
+
+# Streaming export: chunks buffered between COPY and the client before the
+# database side waits for the client to catch up
+EXPORT_BUFFER_CHUNKS = config('EXPORT_BUFFER_CHUNKS', default=16, cast=int)
+
+# Most task ids accepted by one batch_task request
+TASK_BATCH_LIMIT = config('TASK_BATCH_LIMIT', default=100, cast=int)
+
+# Due-date reminders: fire REMINDER_LEAD_HOURS before the start of the due
+# date, for tasks due within REMINDER_HORIZON_DAYS. One worker at a time is
+# leader, chosen through a Postgres advisory lock on REMINDER_LOCK_KEY.
+REMINDERS_ENABLED           = config('REMINDERS_ENABLED', default=True, cast=bool)
+REMINDER_LEAD_HOURS         = config('REMINDER_LEAD_HOURS', default=24, cast=float)
+REMINDER_HORIZON_DAYS       = config('REMINDER_HORIZON_DAYS', default=2, cast=int)
+REMINDER_BATCH_SIZE         = config('REMINDER_BATCH_SIZE', default=1000, cast=int)
+REMINDER_REFRESH_SECONDS    = config('REMINDER_REFRESH_SECONDS', default=3600, cast=float)
+REMINDER_LEADER_RETRY_SECONDS = config('REMINDER_LEADER_RETRY_SECONDS', default=30, cast=float)
+REMINDER_LOCK_KEY           = config('REMINDER_LOCK_KEY', default=7201, cast=int)
+
+# Query-plan regression check (plan_check.py). Seeds a scratch schema in the
+# database at PLAN_CHECK_DSN and fails any statement that seq-scans tasks or
+# touches more shared buffers than its budget. Batch jobs (archiver,
+# reminder loading) get the larger PLAN_CHECK_BATCH_BUFFER_BUDGET.
+PLAN_CHECK_DSN                  = config('PLAN_CHECK_DSN', default=None)
+PLAN_CHECK_SCHEMA               = config('PLAN_CHECK_SCHEMA', default='plan_check')
+PLAN_CHECK_USERS                = config('PLAN_CHECK_USERS', default=5000, cast=int)
+PLAN_CHECK_TASKS_PER_USER       = config('PLAN_CHECK_TASKS_PER_USER', default=100, cast=int)
+PLAN_CHECK_BUFFER_BUDGET        = config('PLAN_CHECK_BUFFER_BUDGET', default=500, cast=int)
+PLAN_CHECK_BATCH_BUFFER_BUDGET  = config('PLAN_CHECK_BATCH_BUFFER_BUDGET', default=20000, cast=int)
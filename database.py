@@ -1,3 +1,4 @@
+import asyncio
 import asyncpg
 import config
 import logging
@@ -5,6 +6,23 @@ import logging
 # Global variable for the asyncpg connection pool
 pool = None
 
+
+class DatabaseUnavailableError(Exception):
+    """
+    Raised when a query cannot be served in time: no pool connection came
+    free within POOL_ACQUIRE_TIMEOUT, or the statement hit its timeout.
+    The API answers these with 503 and Retry-After instead of queueing.
+    """
+
+# In-flight read queries, keyed by normalized query text and parameters.
+# Identical SELECTs issued while one is already running share its result
+# instead of each taking a pool connection.
+_inflight = {}
+coalescing_stats = {
+    'executed'  : 0,  # reads that went to the database
+    'coalesced' : 0   # reads served by an identical in-flight query
+}
+
 # Function to create and return the asyncpg connection pool
 async def create_pool():
     global pool
@@ -17,14 +35,16 @@ async def create_pool():
             database= config.PG_NAME,
             min_size= 16,
             max_size= 32,
-            statement_cache_size= 0
+            statement_cache_size= 0,
+            # Server-side backstop; endpoints pass tighter per-call timeouts
+            server_settings= {'statement_timeout': str(int(config.STATEMENT_TIMEOUT * 1000))}
         )
         logging.info("PostgreSQL connection pool initialized")
 
 async def get_connection():
     try:
         await create_pool()  # Ensure the pool is created
-        conn = await pool.acquire()
+        conn = await pool.acquire(timeout=config.POOL_ACQUIRE_TIMEOUT)
         
         # Check if the connection is alive
         try:
@@ -32,15 +52,97 @@ async def get_connection():
         except Exception as e:
             logging.warning(f"Connection lost, acquiring a new connection: {e}")
             await pool.release(conn)  # Release the old connection
-            conn = await pool.acquire()  # Acquire a new connection
+            conn = await pool.acquire(timeout=config.POOL_ACQUIRE_TIMEOUT)  # Acquire a new connection
 
         return conn
+    except asyncio.TimeoutError:
+        logging.warning(f"No pool connection available within {config.POOL_ACQUIRE_TIMEOUT}s")
+        raise DatabaseUnavailableError("connection pool exhausted")
     except Exception as e:
         logging.error(f"Error getting connection: {e}")
         return None
 
 
-async def execute_query(query: str, params = (), flag="get"):
+def normalize_query(query: str):
+    return " ".join(query.split())
+
+
+async def _run(conn, method, query: str, params, timeout):
+    try:
+        return await method(query, *params, timeout=timeout)
+    except (asyncio.TimeoutError, asyncpg.exceptions.QueryCanceledError) as e:
+        # asyncpg cancels the statement on the server when the timeout fires
+        logging.warning(f"Statement timed out after {timeout or config.STATEMENT_TIMEOUT}s: {e}")
+        raise DatabaseUnavailableError("statement timeout")
+
+
+async def _fetch(query: str, params, timeout=None):
+    conn = await get_connection()
+    if conn is None:
+        raise ConnectionError("Failed to get a connection from the pool.")
+
+    try:
+        return await _run(conn, conn.fetch, query, params, timeout)
+    finally:
+        await pool.release(conn)
+
+
+async def fetch_coalesced(query: str, params = (), timeout=None):
+    normalized = normalize_query(query)
+    key = (normalized, tuple(params))
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable parameters (e.g. lists for ANY($n)) are not coalesced
+        coalescing_stats['executed'] += 1
+        return await _fetch(query, params, timeout)
+
+    entry = _inflight.get(key)
+    if entry is None:
+        coalescing_stats['executed'] += 1
+        task = asyncio.ensure_future(_fetch(query, params, timeout))
+        entry = {'task': task, 'waiters': 0}
+        _inflight[key] = entry
+
+        def _done(t):
+            if key in _inflight and _inflight[key]['task'] is t:
+                del _inflight[key]
+            # Mark the exception retrieved even if every waiter went away
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_done)
+    else:
+        coalescing_stats['coalesced'] += 1
+
+    entry['waiters'] += 1
+    try:
+        # Shielded so one caller being cancelled does not fail the others
+        return await asyncio.shield(entry['task'])
+    finally:
+        entry['waiters'] -= 1
+        # The last caller went away (e.g. client disconnect): stop the query.
+        # The entry is dropped right away, since the task only finishes once
+        # its connection is released and nobody may join it in the meantime.
+        if entry['waiters'] == 0 and not entry['task'].done():
+            if _inflight.get(key) is entry:
+                del _inflight[key]
+            entry['task'].cancel()
+
+
+async def execute_query(query: str, params = (), flag="get", timeout=None):
+    if flag.lower() == "get" and normalize_query(query).upper().startswith("SELECT"):
+        try:
+            result = await fetch_coalesced(query, params, timeout)
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            logging.error(f"Error executing query: {e}")
+            return None
+
+        # Every caller gets its own dicts, the shared Records are never mutated
+        return [dict(row) for row in result]
+
     conn = await get_connection()
     if conn is None:
         logging.error("Failed to get a connection from the pool.")
@@ -50,14 +152,14 @@ async def execute_query(query: str, params = (), flag="get"):
         if flag.lower() == "get":
             # For SELECT queries, fetch results
             data = []
-            result = await conn.fetch(query, *params)  # Use *params for positional parameters
+            result = await _run(conn, conn.fetch, query, params, timeout)  # Use *params for positional parameters
             if result:
                 data = [dict(row) for row in result]  # Use dict() to convert RowProxy objects to dictionaries
             return data
 
         elif flag.lower() in ("insert", "update", "delete"):
             
-            result = await conn.fetchrow(query, *params)
+            result = await _run(conn, conn.fetchrow, query, params, timeout)
             if result:
                 return dict(result)  # Return the inserted row (or ID)
             return None  # No result means insertion failed or no RETURNING clause
@@ -65,6 +167,9 @@ async def execute_query(query: str, params = (), flag="get"):
         else:
             raise ValueError("Invalid flag provided. Use 'get', 'insert', 'update', or 'delete'.")
 
+    except DatabaseUnavailableError:
+        raise
+
     except ValueError as ve:
         logging.error(f"Error executing query: {ve}")
         return None
@@ -2,9 +2,16 @@ import jwt
 from validation_strings import message_strings
 import bcrypt
 import logging
-from database import execute_query
+from storage import storage, TASK_COLUMNS
 import re
 import secrets
+import asyncio
+import config
+import datetime as dt
+
+
+class ClientDisconnectedError(Exception):
+    pass
 
 async def build_response(message: str, status, status_code, data=None):
     # Check if the status is a boolean, if not, convert it to a string
@@ -86,15 +93,11 @@ async def extract_payload_data(form_data):
         raise ValueError(message_strings['invalid_values'])
     
 async def validate_otp(mobile, otp):
-    validate_query = "SELECT id FROM validate_otp WHERE mobile = $1 AND otp = $2"
-    validate_obj = await execute_query(validate_query, (mobile, otp), flag='get')
-    return bool(validate_obj)
+    return await storage.otps.is_valid(mobile, otp, timeout=config.STATEMENT_TIMEOUTS['auth'])
 
 
 async def get_user_data(mobile):
-    user_query = '''SELECT user_id, username, mobile_no, email
-                    FROM users WHERE mobile_no = $1'''
-    user_data = await execute_query(user_query, (mobile,), flag='get')
+    user_data = await storage.users.find_by_mobile(mobile, timeout=config.STATEMENT_TIMEOUTS['auth'])
     
     if user_data:
         user_id = user_data[0]['user_id']
@@ -202,4 +205,85 @@ def validate_mob(mobile):
 
 async def otp_util(n):
     otp = ''.join(secrets.choice("0123456789") for _ in range(n))
-    return otp
\ No newline at end of file
+    return otp
+
+
+async def run_while_connected(request, awaitable):
+    """
+    Await `awaitable` while polling for a client disconnect. If the client
+    hangs up first the work is cancelled (asyncpg cancels the running
+    statement on the server) and ClientDisconnectedError is raised.
+
+    Only use once the request body has been read: the disconnect check
+    consumes messages from the ASGI receive channel.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=config.DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logging.info(f"Client disconnected from {request.url.path}, cancelling query")
+                raise ClientDisconnectedError()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def parse_task_fields(value):
+    """
+    Split a comma separated `fields` parameter into task columns.
+    Returns (fields, invalid): fields is None when the parameter is absent,
+    invalid lists any names that are not task columns.
+    """
+    if not value:
+        return None, []
+
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name and name not in fields:
+            fields.append(name)
+
+    invalid = [name for name in fields if name not in TASK_COLUMNS]
+    return fields or None, invalid
+
+
+async def serialize_tasks(tasks):
+    # Dates and timestamps go out as ISO 8601 strings
+    return [
+        {key: (value.isoformat() if isinstance(value, dt.date) else value)
+         for key, value in item.items()}
+        for item in tasks
+    ]
+
+
+# task_id is an INTEGER column
+TASK_ID_MIN, TASK_ID_MAX = -2**31, 2**31 - 1
+
+
+async def parse_task_ids(values, limit):
+    """
+    Parse task ids given as comma separated and/or repeated parameters.
+    Returns the distinct ids in request order, or None if any is not an int
+    in the range of the task_id column.
+    Parsing stops once there are more than `limit` distinct ids, so an
+    oversized request costs no more than limit + 1 ids to reject.
+    """
+    task_ids = {}  # insertion ordered, used as a set
+    for value in values:
+        for part in value.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                task_id = int(part)
+            except ValueError:
+                return None
+            if not TASK_ID_MIN <= task_id <= TASK_ID_MAX:
+                return None
+            task_ids[task_id] = None
+            if len(task_ids) > limit:
+                return list(task_ids)
+    return list(task_ids)
@@ -0,0 +1,56 @@
+import logging
+import asyncpg
+import config
+
+
+class LocalLeaderLock:
+    """Single-process deployments (and the memory backend) are always leader."""
+
+    async def ensure(self):
+        return True
+
+    async def release(self):
+        pass
+
+
+class PostgresLeaderLock:
+    """
+    Leadership is a session-level advisory lock held on a dedicated
+    connection. If the leader dies its connection closes, the lock is
+    released and another worker picks it up on its next retry.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._conn = None
+
+    async def ensure(self):
+        if self._conn is not None and not self._conn.is_closed():
+            return True
+
+        self._conn = await asyncpg.connect(
+            user= config.PG_USER,
+            password= config.PG_PASSWORD,
+            host= config.PG_HOST,
+            port= config.PG_PORT,
+            database= config.PG_NAME
+        )
+        if await self._conn.fetchval('SELECT pg_try_advisory_lock($1)', self.key):
+            logging.info(f"Became leader for lock {self.key}")
+            return True
+
+        await self._conn.close()
+        self._conn = None
+        return False
+
+    async def release(self):
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+
+def build_leader_lock(key):
+    """One lock per background job, so each job can lead on a different worker."""
+    if config.STORAGE_BACKEND == 'postgres':
+        return PostgresLeaderLock(key)
+    return LocalLeaderLock()
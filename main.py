@@ -1,14 +1,56 @@
 from fastapi import FastAPI, Request
 import api_routes
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 import os
 import uvicorn
+from task_feed import task_feed
+from otp_delivery import otp_worker
+from archiver import task_archiver
+from reminders import reminder_scheduler
+import config
+from database import DatabaseUnavailableError
+from helpers import build_response
+from validation_strings import message_strings
 
-from services import list_tasks_logic, create_task_logic, update_task_logic, delete_task_logic, order_tasks_logic, user_registration_logic, verify_otp_logic, generate_otp_logic
+from services import list_tasks_logic, create_task_logic, update_task_logic, delete_task_logic, order_tasks_logic, user_registration_logic, verify_otp_logic, generate_otp_logic, task_summary_logic, task_feed_logic, query_metrics_logic, export_tasks_logic, batch_tasks_logic
 
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The memory backend dispatches feed events itself, only Postgres needs LISTEN
+    if config.STORAGE_BACKEND == 'postgres':
+        await task_feed.start()
+    if config.OTP_RUN_WORKER:
+        await otp_worker.start()
+    if config.ARCHIVE_ENABLED:
+        await task_archiver.start()
+    if config.REMINDERS_ENABLED:
+        await reminder_scheduler.start()
+    yield
+    await reminder_scheduler.stop()
+    await task_archiver.stop()
+    await otp_worker.stop()
+    await task_feed.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(DatabaseUnavailableError)
+async def database_unavailable(request: Request, exc: DatabaseUnavailableError):
+    # Shed load instead of queueing behind a saturated pool
+    payload, status_code = await build_response(
+        message=message_strings['service_unavailable'],
+        status=message_strings['status_0'],
+        status_code=503
+    )
+    return JSONResponse(
+        content=payload,
+        status_code=status_code,
+        headers={'Retry-After': str(config.RETRY_AFTER_SECONDS)}
+    )
 
 
 @app.get(api_routes.LIST_TASKS)
@@ -51,6 +93,37 @@ async def generate_otp(request : Request):
     payload, status_code = await generate_otp_logic(request)
     return JSONResponse(content= payload, status_code= status_code)
 
+@app.get(api_routes.TASK_SUMMARY)
+async def task_summary(request: Request):
+    payload, status_code = await task_summary_logic(request)
+    return JSONResponse(content=payload, status_code=status_code)
+
+@app.get(api_routes.TASK_FEED)
+async def task_feed_stream(request: Request):
+    response = await task_feed_logic(request)
+    if isinstance(response, tuple):
+        payload, status_code = response
+        return JSONResponse(content=payload, status_code=status_code)
+    return response
+
+@app.get(api_routes.QUERY_METRICS)
+async def query_metrics(request: Request):
+    payload, status_code = await query_metrics_logic(request)
+    return JSONResponse(content=payload, status_code=status_code)
+
+@app.get(api_routes.EXPORT_TASKS)
+async def export_tasks(request: Request):
+    response = await export_tasks_logic(request)
+    if isinstance(response, tuple):
+        payload, status_code = response
+        return JSONResponse(content=payload, status_code=status_code)
+    return response
+
+@app.get(api_routes.BATCH_TASKS)
+async def batch_tasks(request: Request):
+    payload, status_code = await batch_tasks_logic(request)
+    return JSONResponse(content=payload, status_code=status_code)
+
 if __name__ == "__main__":
     is_debug = os.getenv("DEBUG", "0") == "1"
     uvicorn.run(app, host="127.0.0.1", port=8000, reload=is_debug)
\ No newline at end of file
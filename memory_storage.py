@@ -0,0 +1,409 @@
+import bisect
+import csv
+import datetime as dt
+import io
+import itertools
+import json
+from storage import UserRepository, OtpRepository, TaskRepository, TASK_COLUMNS, UPDATABLE_TASK_FIELDS, TASK_ORDER_COLUMNS, EXPORT_FORMATS, check_task_fields
+from task_feed import task_feed
+
+# Stand-in for a NULL due_date in the sorted indexes and counter keys
+NO_DUE_DATE = dt.date.max
+
+# Rows per chunk yielded by exports
+EXPORT_CHUNK_ROWS = 500
+
+
+class UserTaskIndex:
+    """Secondary indexes over one user's live tasks."""
+
+    def __init__(self):
+        self.by_status = {}       # status -> set of task_id
+        self.by_due_date = []     # sorted (due_date, task_id)
+        self.by_created_at = []   # sorted (created_at, task_id)
+
+    def add(self, task):
+        self.by_status.setdefault(task['status'], set()).add(task['task_id'])
+        bisect.insort(self.by_due_date, (task['due_date'] or NO_DUE_DATE, task['task_id']))
+        bisect.insort(self.by_created_at, (task['created_at'], task['task_id']))
+
+    def remove(self, task):
+        ids = self.by_status.get(task['status'])
+        if ids is not None:
+            ids.discard(task['task_id'])
+            if not ids:
+                del self.by_status[task['status']]
+        _remove_sorted(self.by_due_date, (task['due_date'] or NO_DUE_DATE, task['task_id']))
+        _remove_sorted(self.by_created_at, (task['created_at'], task['task_id']))
+
+
+def _remove_sorted(items, key):
+    i = bisect.bisect_left(items, key)
+    if i < len(items) and items[i] == key:
+        del items[i]
+
+
+def _project(row, columns):
+    return {column: row[column] for column in columns}
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value)
+
+
+def _export_chunks(rows, columns, fmt):
+    # Formats values the way COPY ... CSV and row_to_json do
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow(columns)
+
+    for n, row in enumerate(rows, 1):
+        if fmt == 'csv':
+            writer.writerow([_csv_value(row[column]) for column in columns])
+        else:
+            buffer.write(json.dumps({
+                column: (row[column].isoformat() if isinstance(row[column], dt.date) else row[column])
+                for column in columns
+            }) + '\n')
+
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+async def _iterate(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class MemoryEngine:
+    """
+    In-process storage engine with the same observable behaviour as the
+    Postgres schema, including the counter and notify triggers. Every
+    operation runs without awaiting, so each one is atomic on the event loop.
+    """
+
+    def __init__(self):
+        self.users = {}             # user_id -> row
+        self.otps = {}              # mobile -> row
+        self.tasks = {}             # task_id -> row
+        self.archive = {}           # task_id -> row (plus archived_at)
+        self.task_index = {}        # user_id -> UserTaskIndex
+        self.archive_index = {}     # user_id -> {status: set of task_id}
+        self.counters = {}          # user_id -> {(status, due_date): count}
+        self.reminders = set()      # (task_id, due_date) already fired
+        self._user_ids = itertools.count(1)
+        self._task_ids = itertools.count(1)
+        self._otp_ids = itertools.count(1)
+
+    def load(self, users=(), tasks=()):
+        """Seed rows with explicit ids, e.g. for tests and benchmarks."""
+        for user in users:
+            self.users[user['user_id']] = dict(user)
+        for task in tasks:
+            row = {column: task.get(column) for column in TASK_COLUMNS}
+            row['created_at'] = row['created_at'] or dt.datetime.now()
+            row['updated_at'] = row['updated_at'] or row['created_at']
+            self.insert_task(row, notify=False)
+
+        # Keep generated ids clear of the seeded ones
+        self._user_ids = itertools.count(max(self.users, default=0) + 1)
+        self._task_ids = itertools.count(max(self.tasks, default=0) + 1)
+
+    def next_user_id(self):
+        return next(self._user_ids)
+
+    def next_task_id(self):
+        return next(self._task_ids)
+
+    def next_otp_id(self):
+        return next(self._otp_ids)
+
+    def user_index(self, user_id):
+        return self.task_index.setdefault(user_id, UserTaskIndex())
+
+    def _count(self, task, delta):
+        counters = self.counters.setdefault(task['user_id'], {})
+        # Done tasks share one bucket, as in task_counter_due_date()
+        due_date = NO_DUE_DATE if task['status'] == 'Done' else task['due_date'] or NO_DUE_DATE
+        key = (task['status'] or '', due_date)
+        count = counters.get(key, 0) + delta
+        if count > 0:
+            counters[key] = count
+        else:
+            counters.pop(key, None)
+
+    def _notify(self, op, task):
+        task_feed.dispatch({
+            'op'        : op,
+            'task_id'   : task['task_id'],
+            'user_id'   : task['user_id'],
+            'status'    : task['status'],
+            'due_date'  : task['due_date'].isoformat() if task['due_date'] else None
+        })
+
+    def insert_task(self, task, notify=True):
+        self.tasks[task['task_id']] = task
+        self.user_index(task['user_id']).add(task)
+        self._count(task, 1)
+        if notify:
+            self._notify('insert', task)
+
+    def replace_task(self, old, new):
+        self.tasks[new['task_id']] = new
+        index = self.user_index(new['user_id'])
+        index.remove(old)
+        index.add(new)
+        self._count(old, -1)
+        self._count(new, 1)
+        self._notify('update', new)
+
+    def remove_task(self, task):
+        del self.tasks[task['task_id']]
+        self.user_index(task['user_id']).remove(task)
+        self._count(task, -1)
+        self._notify('delete', task)
+
+    def archive_task(self, task):
+        # Like the archiver's DELETE in Postgres: the task leaves the live set
+        # but the counters are untouched, and the feed sees 'archive'
+        del self.tasks[task['task_id']]
+        self.user_index(task['user_id']).remove(task)
+        self.archive[task['task_id']] = dict(task, archived_at=dt.datetime.now())
+        self.archive_index.setdefault(task['user_id'], {}).setdefault(task['status'], set()).add(task['task_id'])
+        self._notify('archive', task)
+
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def find_by_mobile_or_email(self, mobile, email, timeout=None):
+        return [
+            {'user_id': user['user_id']}
+            for user in self.engine.users.values()
+            if user['mobile_no'] == mobile or user['email'] == email
+        ]
+
+    async def create(self, username, email, password_hash, mobile, timeout=None):
+        user_id = self.engine.next_user_id()
+        now = dt.datetime.now()
+        self.engine.users[user_id] = {
+            'user_id'       : user_id,
+            'username'      : username,
+            'email'         : email,
+            'password_hash' : password_hash,
+            'mobile_no'     : mobile,
+            'created_at'    : now,
+            'updated_at'    : now
+        }
+        return {'user_id': user_id}
+
+    async def find_by_mobile(self, mobile, timeout=None):
+        return [
+            {key: user.get(key) for key in ('user_id', 'username', 'mobile_no', 'email')}
+            for user in self.engine.users.values()
+            if user['mobile_no'] == mobile
+        ]
+
+
+class MemoryOtpRepository(OtpRepository):
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def upsert(self, mobile, otp, created, updated, timeout=None):
+        row = self.engine.otps.get(mobile)
+        if row is None:
+            row = {'id': self.engine.next_otp_id(), 'mobile': mobile, 'created': created}
+            self.engine.otps[mobile] = row
+        row['otp'] = otp
+        row['updated'] = updated
+        return {'id': row['id']}
+
+    async def is_valid(self, mobile, otp, timeout=None):
+        row = self.engine.otps.get(mobile)
+        return row is not None and row['otp'] == otp
+
+
+class MemoryTaskRepository(TaskRepository):
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _owned(self, user_id, task_id):
+        task = self.engine.tasks.get(task_id)
+        if task is None or task['user_id'] != user_id:
+            return None
+        return task
+
+    async def list_for_user(self, user_id, status=None, include_archived=False, fields=None, timeout=None):
+        columns = check_task_fields(fields)
+        index = self.engine.task_index.get(user_id)
+        if index is None:
+            task_ids = []
+        elif status:
+            task_ids = sorted(index.by_status.get(status, ()))
+        else:
+            task_ids = [task_id for _, task_id in index.by_created_at]
+
+        rows = [_project(self.engine.tasks[task_id], columns) for task_id in task_ids]
+        if not include_archived:
+            return rows
+
+        for row in rows:
+            row['archived'] = False
+
+        archived = self.engine.archive_index.get(user_id, {})
+        if status:
+            archived_ids = sorted(archived.get(status, ()))
+        else:
+            archived_ids = sorted(itertools.chain.from_iterable(archived.values()))
+        for task_id in archived_ids:
+            row = _project(self.engine.archive[task_id], columns)
+            row['archived'] = True
+            rows.append(row)
+        return rows
+
+    async def list_open_ordered(self, user_id, order_by, fields=None, timeout=None):
+        if order_by not in TASK_ORDER_COLUMNS:
+            raise ValueError(f"Invalid order_by column {order_by!r}")
+        columns = check_task_fields(fields)
+
+        index = self.engine.task_index.get(user_id)
+        if index is None:
+            return []
+
+        ordered = index.by_due_date if order_by == 'due_date' else index.by_created_at
+        rows = []
+        for _, task_id in ordered:
+            task = self.engine.tasks[task_id]
+            # Mirrors SQL `status != 'Done'`, which is never true for NULL
+            if task['status'] is not None and task['status'] != 'Done':
+                rows.append(_project(task, columns))
+        return rows
+
+    async def get_many(self, user_id, task_ids, include_archived=False, fields=None, timeout=None):
+        columns = check_task_fields(fields)
+        rows = []
+        for task_id in task_ids:
+            task = self._owned(user_id, task_id)
+            if task is not None:
+                row = _project(task, columns)
+                if include_archived:
+                    row['archived'] = False
+                rows.append(row)
+                continue
+
+            archived = self.engine.archive.get(task_id)
+            if include_archived and archived is not None and archived['user_id'] == user_id:
+                row = _project(archived, columns)
+                row['archived'] = True
+                rows.append(row)
+        return rows
+
+    async def create(self, user_id, title, description, status, due_date, timeout=None):
+        now = dt.datetime.now()
+        task = {
+            'task_id'       : self.engine.next_task_id(),
+            'title'         : title,
+            'description'   : description,
+            'status'        : status,
+            'due_date'      : due_date,
+            'created_at'    : now,
+            'updated_at'    : now,
+            'user_id'       : user_id
+        }
+        self.engine.insert_task(task)
+        return {'task_id': task['task_id']}
+
+    async def update(self, user_id, task_id, due_date, fields, timeout=None):
+        invalid = set(fields) - set(UPDATABLE_TASK_FIELDS)
+        if invalid:
+            raise ValueError(f"Invalid task fields {sorted(invalid)}")
+
+        old = self._owned(user_id, task_id)
+        if old is None:
+            return None
+
+        new = dict(old, **fields, due_date=due_date, updated_at=dt.datetime.now())
+        self.engine.replace_task(old, new)
+        return {'task_id': task_id}
+
+    async def delete(self, user_id, task_id, timeout=None):
+        task = self._owned(user_id, task_id)
+        if task is None:
+            return None
+
+        self.engine.remove_task(task)
+        return {'task_id': task_id}
+
+    async def export_for_user(self, user_id, fmt, include_archived=False, fields=None, timeout=None):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Invalid export format {fmt!r}")
+
+        columns = check_task_fields(fields)
+        if include_archived:
+            columns = columns + ('archived',)
+
+        rows = await self.list_for_user(user_id, include_archived=include_archived, fields=fields)
+        return _iterate(_export_chunks(rows, columns, fmt))
+
+    async def upcoming_due(self, start, end, after, limit):
+        rows = []
+        for index in self.engine.task_index.values():
+            # First entry past the keyset cursor and not before start
+            i = max(bisect.bisect_right(index.by_due_date, after), bisect.bisect_left(index.by_due_date, (start,)))
+            for due_date, task_id in index.by_due_date[i:]:
+                if due_date > end:
+                    break
+                task = self.engine.tasks[task_id]
+                if task['status'] != 'Done':
+                    rows.append({key: task[key] for key in ('task_id', 'user_id', 'status', 'due_date')})
+
+        rows.sort(key=lambda row: (row['due_date'], row['task_id']))
+        return rows[:limit]
+
+    async def claim_reminder(self, task_id, due_date):
+        if (task_id, due_date) in self.engine.reminders:
+            return False
+        self.engine.reminders.add((task_id, due_date))
+        return True
+
+    async def release_reminder(self, task_id, due_date):
+        self.engine.reminders.discard((task_id, due_date))
+
+    async def summary_counters(self, user_id, due_soon_days, timeout=None):
+        today = dt.date.today()
+        due_soon_until = today + dt.timedelta(days=due_soon_days)
+
+        by_status = {}
+        for (status, due_date), count in self.engine.counters.get(user_id, {}).items():
+            row = by_status.setdefault(status, {'status': status, 'total': 0, 'overdue': 0, 'due_soon': 0})
+            row['total'] += count
+            if due_date < today:
+                row['overdue'] += count
+            elif due_date <= due_soon_until:
+                row['due_soon'] += count
+        return list(by_status.values())
+
+    async def archive_done(self, after_days, batch_size):
+        cutoff = dt.datetime.now() - dt.timedelta(days=after_days)
+        candidates = sorted(
+            (self.engine.tasks[task_id]
+             for index in self.engine.task_index.values()
+             for task_id in index.by_status.get('Done', ())
+             if self.engine.tasks[task_id]['updated_at'] < cutoff),
+            key=lambda task: task['updated_at']
+        )[:batch_size]
+
+        for task in candidates:
+            self.engine.archive_task(task)
+        return len(candidates)
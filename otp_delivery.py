@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import nats
+import config
+
+# Subject OTP delivery jobs are published on
+OTP_SUBJECT = 'otp.delivery'
+
+
+class InMemoryMessage:
+    def __init__(self, broker, subject, data):
+        self._broker = broker
+        self.subject = subject
+        self.data = data
+
+    async def ack(self):
+        pass
+
+    async def nak(self, delay=None):
+        # Put the job back so a later batch retries it
+        if not delay:
+            await self._broker.publish(self.subject, self.data)
+            return
+        asyncio.get_running_loop().call_later(
+            delay, self._broker._queue(self.subject).put_nowait, self.data
+        )
+
+
+class InMemoryBroker:
+    """
+    In-process stand-in for NATS, for tests and single-process deployments.
+
+    Jobs only live as long as the process, so anything still queued at
+    shutdown is lost.
+    """
+
+    def __init__(self):
+        self._queues = {}
+
+    def _queue(self, subject):
+        return self._queues.setdefault(subject, asyncio.Queue())
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def publish(self, subject, data):
+        self._queue(subject).put_nowait(data)
+
+    async def fetch(self, subject, batch_size, timeout):
+        queue = self._queue(subject)
+        try:
+            data = await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+
+        messages = [InMemoryMessage(self, subject, data)]
+        while len(messages) < batch_size and not queue.empty():
+            messages.append(InMemoryMessage(self, subject, queue.get_nowait()))
+        return messages
+
+
+class NatsBroker:
+    """
+    JetStream backed broker. Published jobs are persisted by the server and
+    redelivered if a worker fails to ack them.
+    """
+
+    def __init__(self, url, stream, durable):
+        self.url = url
+        self.stream = stream
+        self.durable = durable
+        self._nc = None
+        self._js = None
+        self._subscriptions = {}
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self):
+        # Concurrent first publishes must not open a connection each, or use
+        # the connection before the stream exists
+        async with self._connect_lock:
+            if self._nc is None:
+                nc = await nats.connect(self.url)
+                js = nc.jetstream()
+                await js.add_stream(name=self.stream, subjects=[OTP_SUBJECT])
+                self._nc, self._js = nc, js
+                logging.info(f"Connected to NATS at {self.url}")
+
+    async def close(self):
+        if self._nc is not None:
+            await self._nc.drain()
+            self._nc = None
+            self._js = None
+            self._subscriptions = {}
+
+    async def publish(self, subject, data):
+        await self.connect()
+        await self._js.publish(subject, data)
+
+    async def fetch(self, subject, batch_size, timeout):
+        await self.connect()
+        subscription = self._subscriptions.get(subject)
+        if subscription is None:
+            subscription = await self._js.pull_subscribe(subject, durable=self.durable)
+            self._subscriptions[subject] = subscription
+
+        try:
+            return await subscription.fetch(batch_size, timeout=timeout)
+        except nats.errors.TimeoutError:
+            return []
+
+
+class OtpOutbox:
+    """Hands generated OTPs to the broker; delivery happens in the worker."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def publish(self, mobile, otp):
+        job = json.dumps({'mobile': mobile, 'otp': otp}).encode('utf-8')
+        await self.broker.publish(OTP_SUBJECT, job)
+        logging.info(f"OTP delivery job queued for {mobile}")
+
+
+class LoggingSmsSender:
+    """Placeholder sender until an SMS gateway is wired up."""
+
+    async def send_batch(self, jobs):
+        for job in jobs:
+            logging.info(f"Delivering OTP to {job['mobile']}")
+
+
+class OtpDeliveryWorker:
+    """
+    Delivers queued OTPs in batches. When the sender fails the batch is
+    nak'ed for redelivery after a delay, and the worker itself backs off
+    (doubling up to max_retry_delay) so a gateway outage does not turn into
+    a busy loop.
+    """
+
+    def __init__(self, broker, sender, batch_size, poll_timeout, retry_delay=1, max_retry_delay=60):
+        self.broker = broker
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.failures = 0  # consecutive failed batches
+        self._task = None
+
+    def backoff(self):
+        if not self.failures:
+            return 0
+        return min(self.retry_delay * 2 ** (self.failures - 1), self.max_retry_delay)
+
+    async def process_batch(self):
+        messages = await self.broker.fetch(OTP_SUBJECT, self.batch_size, self.poll_timeout)
+        if not messages:
+            return 0
+
+        jobs, delivered = [], []
+        for message in messages:
+            try:
+                jobs.append(json.loads(message.data))
+                delivered.append(message)
+            except ValueError as e:
+                # A malformed job will never succeed, drop it
+                logging.error(f"Dropping malformed OTP job {message.data!r}: {e}")
+                await message.ack()
+
+        if not jobs:
+            return 0
+
+        try:
+            await self.sender.send_batch(jobs)
+        except Exception as e:
+            self.failures += 1
+            delay = self.backoff()
+            logging.error(f"OTP delivery failed for a batch of {len(jobs)}, retrying in {delay}s: {e}")
+            for message in delivered:
+                await message.nak(delay=delay)
+            return 0
+
+        self.failures = 0
+        for message in delivered:
+            await message.ack()
+        return len(jobs)
+
+    async def run(self):
+        while True:
+            try:
+                await self.process_batch()
+                if self.failures:
+                    await asyncio.sleep(self.backoff())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error in OTP delivery worker: {e}")
+                await asyncio.sleep(self.poll_timeout)
+
+    async def start(self):
+        if self._task is None:
+            await self.broker.connect()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.broker.close()
+
+
+def build_broker():
+    if config.OTP_BROKER == 'nats':
+        return NatsBroker(config.NATS_URL, config.NATS_OTP_STREAM, config.NATS_OTP_DURABLE)
+    return InMemoryBroker()
+
+
+otp_broker = build_broker()
+otp_outbox = OtpOutbox(otp_broker)
+otp_worker = OtpDeliveryWorker(
+    otp_broker, LoggingSmsSender(), config.OTP_BATCH_SIZE, config.OTP_POLL_TIMEOUT,
+    config.OTP_RETRY_DELAY, config.OTP_RETRY_MAX_DELAY
+)
+
+
+if __name__ == "__main__":
+    # Standalone worker: python otp_delivery.py (requires OTP_BROKER=nats)
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        await otp_broker.connect()
+        try:
+            await otp_worker.run()
+        finally:
+            await otp_broker.close()
+
+    asyncio.run(main())
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import config
+import database
+from database import execute_query
+from storage import UserRepository, OtpRepository, TaskRepository, UPDATABLE_TASK_FIELDS, TASK_ORDER_COLUMNS, EXPORT_FORMATS, check_task_fields
+
+# Moves one batch of old Done tasks into tasks_archive in a single statement,
+# so a task is never in both tables or in neither. SKIP LOCKED keeps the
+# archiver from blocking on tasks a user is updating.
+ARCHIVE_BATCH_QUERY = """
+    WITH candidates AS (
+        SELECT task_id FROM tasks
+        WHERE status = 'Done' AND updated_at < NOW() - make_interval(days => $1)
+        ORDER BY updated_at
+        LIMIT $2
+        FOR UPDATE SKIP LOCKED
+    ), moved AS (
+        DELETE FROM tasks USING candidates
+        WHERE tasks.task_id = candidates.task_id
+        RETURNING tasks.task_id, tasks.title, tasks.description, tasks.status,
+                  tasks.due_date, tasks.created_at, tasks.updated_at, tasks.user_id
+    )
+    INSERT INTO tasks_archive (task_id, title, description, status, due_date, created_at, updated_at, user_id)
+    SELECT task_id, title, description, status, due_date, created_at, updated_at, user_id FROM moved
+    RETURNING task_id
+"""
+
+# task_counters is maintained by trigger (see sql/001_task_counters.sql), so
+# this reads a handful of counter rows instead of the user's tasks
+SUMMARY_QUERY = """
+    SELECT status,
+           SUM(task_count) AS total,
+           COALESCE(SUM(task_count) FILTER (WHERE due_date < CURRENT_DATE), 0) AS overdue,
+           COALESCE(SUM(task_count) FILTER (
+               WHERE due_date >= CURRENT_DATE AND due_date <= CURRENT_DATE + $2::int
+           ), 0) AS due_soon
+    FROM task_counters
+    WHERE user_id = $1 AND task_count > 0
+    GROUP BY status
+"""
+
+
+async def archive_batch(conn, after_days, batch_size):
+    """Run one ARCHIVE_BATCH_QUERY on `conn` and return the number of tasks moved."""
+    async with conn.transaction():
+        # Tells the tasks triggers this DELETE is a move: counters stay as
+        # they are and the feed gets 'archive' (sql/001, sql/002)
+        await conn.execute("SET LOCAL avrio.archiving = 'on'")
+        moved = await conn.fetch(ARCHIVE_BATCH_QUERY, after_days, batch_size)
+    return len(moved)
+
+
+class CopyExport:
+    """
+    Async iterator over the output of a COPY ... TO STDOUT.
+
+    It owns its pool connection from the moment it is created, and aclose()
+    returns the connection whether or not iteration ever started. A response
+    can be cancelled before its body is first read, so the caller must
+    always aclose() it (the export endpoint does so as a background task).
+    """
+
+    def __init__(self, conn, query, params, copy_options):
+        self._conn = conn
+        self._query = query
+        self._params = params
+        self._copy_options = copy_options
+        self._producer = None
+        self._closed = False
+
+    def __aiter__(self):
+        return self._stream()
+
+    async def _stream(self):
+        # COPY writes into a bounded queue: when the client reads slowly the
+        # queue fills and COPY waits, so memory stays constant
+        chunks = asyncio.Queue(maxsize=config.EXPORT_BUFFER_CHUNKS)
+
+        async def write(chunk):
+            await chunks.put(bytes(chunk))
+
+        async def produce():
+            try:
+                await self._conn.copy_from_query(self._query, *self._params, output=write, **self._copy_options)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await chunks.put(e)
+                return
+            await chunks.put(None)
+
+        if self._closed:
+            return
+        self._producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    logging.error(f"Task export failed: {chunk}")
+                    raise chunk
+                yield chunk
+        finally:
+            # Shielded: on client disconnect this runs inside a cancelled scope
+            await asyncio.shield(self.aclose())
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._producer is not None:
+            self._producer.cancel()
+            try:
+                await self._producer
+            except (asyncio.CancelledError, Exception):
+                pass
+        await database.pool.release(self._conn)
+
+
+class PostgresUserRepository(UserRepository):
+    async def find_by_mobile_or_email(self, mobile, email, timeout=None):
+        return await execute_query(
+            "SELECT user_id FROM users WHERE mobile_no = $1 or email = $2", (mobile, email,), flag="get",
+            timeout=timeout
+        )
+
+    async def create(self, username, email, password_hash, mobile, timeout=None):
+        query = """
+            INSERT INTO users (username, email, password_hash, mobile_no)
+            VALUES ($1, $2, $3, $4)
+            RETURNING user_id
+        """
+        return await execute_query(query, params=(username, email, password_hash, mobile,), flag="insert", timeout=timeout)
+
+    async def find_by_mobile(self, mobile, timeout=None):
+        query = '''SELECT user_id, username, mobile_no, email
+                   FROM users WHERE mobile_no = $1'''
+        return await execute_query(query, (mobile,), flag='get', timeout=timeout)
+
+
+class PostgresOtpRepository(OtpRepository):
+    async def upsert(self, mobile, otp, created, updated, timeout=None):
+        query = """
+            INSERT INTO validate_otp (mobile, otp, created, updated)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (mobile)
+            DO UPDATE SET otp = EXCLUDED.otp, updated = EXCLUDED.updated
+            RETURNING id
+        """
+        return await execute_query(query, params=(mobile, otp, created, updated), flag='insert', timeout=timeout)
+
+    async def is_valid(self, mobile, otp, timeout=None):
+        query = "SELECT id FROM validate_otp WHERE mobile = $1 AND otp = $2"
+        return bool(await execute_query(query, (mobile, otp), flag='get', timeout=timeout))
+
+
+class PostgresTaskRepository(TaskRepository):
+    def _list_query(self, user_id, status, include_archived, fields):
+        # Column names are interpolated, so they must come from the whitelist.
+        # A narrow list lets the planner answer from a covering index
+        # (see sql/004_task_list_indexes.sql) without touching the heap.
+        select_list = ", ".join(check_task_fields(fields))
+
+        condition = "user_id = $1 "
+        params = (user_id,)
+        if status:
+            condition += "and status = $2"
+            params = (user_id, status,)
+
+        if include_archived:
+            # Archived tasks live in their own table (see archiver.py)
+            query = f"""
+                SELECT {select_list}, FALSE AS archived FROM tasks WHERE {condition}
+                UNION ALL
+                SELECT {select_list}, TRUE AS archived FROM tasks_archive WHERE {condition}
+            """
+        else:
+            query = f"SELECT {select_list} FROM tasks where {condition}"
+        return query, params
+
+    async def list_for_user(self, user_id, status=None, include_archived=False, fields=None, timeout=None):
+        query, params = self._list_query(user_id, status, include_archived, fields)
+        return await execute_query(query, params=params, flag="get", timeout=timeout)
+
+    async def list_open_ordered(self, user_id, order_by, fields=None, timeout=None):
+        # order_by and fields are interpolated, so they must come from the whitelists
+        if order_by not in TASK_ORDER_COLUMNS:
+            raise ValueError(f"Invalid order_by column {order_by!r}")
+        select_list = ", ".join(check_task_fields(fields))
+
+        query = f"""
+            SELECT {select_list} FROM tasks
+            WHERE user_id = $1 AND status != $2
+            ORDER BY {order_by} ASC
+        """
+        return await execute_query(query, (user_id, 'Done',), flag="get", timeout=timeout)
+
+    async def get_many(self, user_id, task_ids, include_archived=False, fields=None, timeout=None):
+        select_list = ", ".join(check_task_fields(fields))
+        condition = "user_id = $1 AND task_id = ANY($2::int[])"
+
+        if include_archived:
+            query = f"""
+                SELECT {select_list}, FALSE AS archived FROM tasks WHERE {condition}
+                UNION ALL
+                SELECT {select_list}, TRUE AS archived FROM tasks_archive WHERE {condition}
+            """
+        else:
+            query = f"SELECT {select_list} FROM tasks WHERE {condition}"
+
+        # A tuple keeps the parameters hashable, so identical batches coalesce
+        return await execute_query(query, (user_id, tuple(task_ids),), flag="get", timeout=timeout)
+
+    async def create(self, user_id, title, description, status, due_date, timeout=None):
+        query = """
+            INSERT INTO tasks (title, description, status, due_date, created_at, updated_at, user_id)
+            VALUES ($1, $2, $3, $4, NOW(), NOW(), $5)
+            RETURNING task_id
+        """
+        return await execute_query(query, params=(title, description, status, due_date, user_id), flag="insert", timeout=timeout)
+
+    async def update(self, user_id, task_id, due_date, fields, timeout=None):
+        # Column names are interpolated, so they must come from the whitelist
+        invalid = set(fields) - set(UPDATABLE_TASK_FIELDS)
+        if invalid:
+            raise ValueError(f"Invalid task fields {sorted(invalid)}")
+
+        set_clause = "".join([f"{key} = ${i+4}, " for i, key in enumerate(fields.keys())])
+        query = f"UPDATE tasks SET {set_clause}due_date = $3, updated_at = NOW() WHERE task_id = $1 and user_id = $2 RETURNING task_id"
+
+        params = [task_id, user_id, due_date] + list(fields.values())
+        return await execute_query(query, params=tuple(params), flag="update", timeout=timeout)
+
+    async def delete(self, user_id, task_id, timeout=None):
+        query = "DELETE FROM tasks WHERE task_id = $1 and user_id = $2 RETURNING task_id"
+        return await execute_query(query, params=(task_id, user_id,), flag="delete", timeout=timeout)
+
+    def _export_query(self, user_id, fmt, include_archived, fields):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Invalid export format {fmt!r}")
+
+        query, params = self._list_query(user_id, None, include_archived, fields)
+        if fmt == 'csv':
+            return query, params, {'format': 'csv', 'header': True}
+
+        # One JSON document per line. The quote and delimiter are control
+        # characters row_to_json always escapes, so CSV mode passes each
+        # document through verbatim.
+        query = f"SELECT row_to_json(t) FROM ({query}) t"
+        return query, params, {'format': 'csv', 'quote': '\x01', 'delimiter': '\x02'}
+
+    async def export_for_user(self, user_id, fmt, include_archived=False, fields=None, timeout=None):
+        query, params, copy_options = self._export_query(user_id, fmt, include_archived, fields)
+
+        # Taken up front so a saturated pool is a 503, not a truncated stream
+        conn = await database.get_connection()
+        if conn is None:
+            raise ConnectionError("Failed to get a connection from the pool.")
+
+        try:
+            if timeout:
+                # Exports outlive the pool's default statement_timeout; the
+                # setting is reset when the connection goes back to the pool
+                await conn.execute(f"SET statement_timeout = {int(timeout * 1000)}")
+        except Exception:
+            await database.pool.release(conn)
+            raise
+
+        return CopyExport(conn, query, params, copy_options)
+
+    async def upcoming_due(self, start, end, after, limit):
+        # Keyset pagination over tasks_due_date_idx (sql/005_task_reminders.sql)
+        query = """
+            SELECT task_id, user_id, status, due_date FROM tasks
+            WHERE due_date >= $1 AND due_date <= $2
+              AND (due_date, task_id) > ($3, $4)
+              AND status IS DISTINCT FROM 'Done'
+            ORDER BY due_date, task_id
+            LIMIT $5
+        """
+        after_due_date, after_task_id = after
+        return await execute_query(query, (start, end, after_due_date, after_task_id, limit,), flag="get")
+
+    async def claim_reminder(self, task_id, due_date):
+        query = """
+            INSERT INTO task_reminders (task_id, due_date) VALUES ($1, $2)
+            ON CONFLICT DO NOTHING
+            RETURNING task_id
+        """
+        return bool(await execute_query(query, (task_id, due_date,), flag="insert"))
+
+    async def release_reminder(self, task_id, due_date):
+        query = "DELETE FROM task_reminders WHERE task_id = $1 AND due_date = $2 RETURNING task_id"
+        await execute_query(query, (task_id, due_date,), flag="delete")
+
+    async def summary_counters(self, user_id, due_soon_days, timeout=None):
+        return await execute_query(SUMMARY_QUERY, (user_id, due_soon_days,), flag="get", timeout=timeout)
+
+    async def archive_done(self, after_days, batch_size):
+        conn = await database.get_connection()
+        if conn is None:
+            raise ConnectionError("Failed to get a connection from the pool.")
+
+        try:
+            return await archive_batch(conn, after_days, batch_size)
+        finally:
+            await database.pool.release(conn)
@@ -0,0 +1,283 @@
+import asyncio
+import datetime as dt
+import itertools
+import json
+import logging
+import os
+import sys
+import asyncpg
+import config
+# storage before pg_storage: building the default backend imports pg_storage
+from storage import UPDATABLE_TASK_FIELDS, TASK_ORDER_COLUMNS, EXPORT_FORMATS
+import pg_storage
+from pg_storage import PostgresUserRepository, PostgresOtpRepository, PostgresTaskRepository
+
+# Query-plan regression check.
+#
+# Every statement the service can emit is collected by driving the Postgres
+# repositories with a recording execute_query, so the f-string variants
+# (update's SET clause, order_by, fields, include_archived, export format)
+# come from the same code that builds them in production. Each one is then
+# run under EXPLAIN (ANALYZE, BUFFERS) against a seeded scratch schema, inside
+# a transaction that is rolled back.
+#
+#   python plan_check.py          seed, explain and report; exits 1 on failure
+#   python plan_check.py --list   print the statements without a database
+
+# Relations that must always be reached through an index
+SEQ_SCAN_FORBIDDEN = ('tasks', 'tasks_archive')
+
+# The shape the covering indexes in sql/004_task_list_indexes.sql serve
+NARROW_FIELDS = ('task_id', 'title', 'status', 'due_date')
+FIELD_VARIANTS = (None, NARROW_FIELDS)
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
+
+SEED_USERS_QUERY = """
+    INSERT INTO users (username, email, password_hash, mobile_no, created_at, updated_at)
+    SELECT 'user' || n, 'user' || n || '@example.com', 'x', (6000000000 + n)::text, NOW(), NOW()
+    FROM generate_series(1, $1) n
+"""
+
+# A user's tasks are interleaved with everyone else's, as they would be after
+# months of concurrent inserts, so reads by user cannot lean on heap locality
+SEED_TASKS_QUERY = """
+    INSERT INTO tasks (title, description, status, due_date, created_at, updated_at, user_id)
+    SELECT 'Task ' || n,
+           repeat('Task description ', 1 + n % 8),
+           (ARRAY['To Do', 'In Progress', 'Done'])[1 + n % 3],
+           CASE WHEN n % 10 = 0 THEN NULL ELSE CURRENT_DATE + (n % 120 - 30) END,
+           NOW() - make_interval(days => n % 400),
+           NOW() - make_interval(days => n % 200),
+           1 + n % $1
+    FROM generate_series(1, $1 * $2) n
+"""
+
+SEED_ARCHIVE_QUERY = """
+    INSERT INTO tasks_archive (task_id, title, description, status, due_date, created_at, updated_at, user_id)
+    SELECT $3 + n, 'Archived task ' || n, 'Archived', 'Done',
+           CURRENT_DATE - (n % 365),
+           NOW() - make_interval(days => 400 + n % 300),
+           NOW() - make_interval(days => 365 + n % 300),
+           1 + n % $1
+    FROM generate_series(1, $1 * $2 / 2) n
+"""
+
+SEED_OTPS_QUERY = """
+    INSERT INTO validate_otp (mobile, otp, created, updated)
+    SELECT mobile_no, '123456', NOW(), NOW() FROM users
+"""
+
+
+async def collect_statements(sample):
+    """
+    Return (name, query, params, budget) for every statement the service
+    can emit, using the ids and contact details in `sample`.
+    """
+    users, otps, tasks = PostgresUserRepository(), PostgresOtpRepository(), PostgresTaskRepository()
+    user_id, task_id, task_ids = sample['user_id'], sample['task_id'], sample['task_ids']
+    mobile, email = sample['mobile'], sample['email']
+    today, now = dt.date.today(), dt.datetime.now()
+    budget, batch_budget = config.PLAN_CHECK_BUFFER_BUDGET, config.PLAN_CHECK_BATCH_BUFFER_BUDGET
+
+    def label(fields):
+        return 'narrow' if fields else 'all'
+
+    calls = [
+        ('users.find_by_mobile_or_email', users.find_by_mobile_or_email(mobile, email), budget),
+        ('users.find_by_mobile', users.find_by_mobile(mobile), budget),
+        ('users.create', users.create('plan check', 'plan.check@example.com', 'x', '5999999999'), budget),
+        ('otps.upsert', otps.upsert(mobile, '654321', now, now), budget),
+        ('otps.is_valid', otps.is_valid(mobile, '123456'), budget),
+        ('tasks.create', tasks.create(user_id, 'Plan check', 'Plan check', 'To Do', today), budget),
+        ('tasks.delete', tasks.delete(user_id, task_id), budget),
+        ('tasks.summary_counters', tasks.summary_counters(user_id, config.DUE_SOON_DAYS), budget),
+        ('tasks.claim_reminder', tasks.claim_reminder(task_id, today), budget),
+        ('tasks.release_reminder', tasks.release_reminder(task_id, today), budget),
+        ('tasks.upcoming_due', tasks.upcoming_due(
+            today, today + dt.timedelta(days=config.REMINDER_HORIZON_DAYS), (today, 0), config.REMINDER_BATCH_SIZE
+        ), batch_budget),
+    ]
+
+    for status, include_archived, fields in itertools.product((None, 'To Do'), (False, True), FIELD_VARIANTS):
+        name = f"tasks.list_for_user(status={status}, include_archived={include_archived}, fields={label(fields)})"
+        calls.append((name, tasks.list_for_user(user_id, status, include_archived, fields), budget))
+
+    for order_by, fields in itertools.product(TASK_ORDER_COLUMNS, FIELD_VARIANTS):
+        name = f"tasks.list_open_ordered(order_by={order_by}, fields={label(fields)})"
+        calls.append((name, tasks.list_open_ordered(user_id, order_by, fields), budget))
+
+    for include_archived, fields in itertools.product((False, True), FIELD_VARIANTS):
+        name = f"tasks.get_many(include_archived={include_archived}, fields={label(fields)})"
+        calls.append((name, tasks.get_many(user_id, task_ids, include_archived=include_archived, fields=fields), budget))
+
+    # Every combination of updatable columns, including due_date alone
+    values = {'title': 'Renamed', 'description': 'Changed', 'status': 'In Progress'}
+    for size in range(len(UPDATABLE_TASK_FIELDS) + 1):
+        for combo in itertools.combinations(UPDATABLE_TASK_FIELDS, size):
+            name = f"tasks.update({','.join(combo) or 'due_date only'})"
+            calls.append((name, tasks.update(user_id, task_id, today, {key: values[key] for key in combo}), budget))
+
+    recorded = []
+
+    async def record(query, params=(), flag="get", timeout=None):
+        recorded.append((query, tuple(params)))
+        return []
+
+    statements = []
+    original = pg_storage.execute_query
+    pg_storage.execute_query = record
+    try:
+        for name, call, statement_budget in calls:
+            recorded.clear()
+            await call
+            for query, params in recorded:
+                statements.append((name, query, params, statement_budget))
+    finally:
+        pg_storage.execute_query = original
+
+    # The archiver runs its batch in its own transaction
+    statements.append((
+        'tasks.archive_done', pg_storage.ARCHIVE_BATCH_QUERY,
+        (config.ARCHIVE_AFTER_DAYS, config.ARCHIVE_BATCH_SIZE), batch_budget
+    ))
+
+    # Exports go straight to COPY rather than through execute_query
+    for fmt, include_archived, fields in itertools.product(EXPORT_FORMATS, (False, True), FIELD_VARIANTS):
+        query, params, _ = tasks._export_query(user_id, fmt, include_archived, fields)
+        name = f"tasks.export_for_user(fmt={fmt}, include_archived={include_archived}, fields={label(fields)})"
+        statements.append((name, query, params, budget))
+
+    return statements
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def shared_buffers(plan):
+    # The root node's counts include everything below it
+    return plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0)
+
+
+def check_plan(plan, budget):
+    """Return the problems found in one EXPLAIN (FORMAT JSON) plan."""
+    problems = []
+    for node in plan_nodes(plan['Plan']):
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in SEQ_SCAN_FORBIDDEN:
+            problems.append(f"Seq Scan on {node['Relation Name']}")
+
+    buffers = shared_buffers(plan)
+    if buffers > budget:
+        problems.append(f"{buffers} shared buffers, budget {budget}")
+    return problems
+
+
+async def explain(conn, query, params):
+    # Rolled back, so writes leave the seeded data as it was
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        result = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *params)
+    finally:
+        await transaction.rollback()
+    return json.loads(result)[0]
+
+
+async def apply_schema(conn):
+    for name in sorted(os.listdir(SQL_DIR)):
+        if not name.endswith('.sql'):
+            continue
+        with open(os.path.join(SQL_DIR, name)) as f:
+            # Nothing else writes to the scratch schema, and CONCURRENTLY
+            # cannot run in the implicit transaction of a multi-statement string
+            await conn.execute(f.read().replace(' CONCURRENTLY', ''))
+
+
+async def seed(conn):
+    schema = config.PLAN_CHECK_SCHEMA
+    users, per_user = config.PLAN_CHECK_USERS, config.PLAN_CHECK_TASKS_PER_USER
+
+    await conn.execute(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE')
+    await conn.execute(f'CREATE SCHEMA "{schema}"')
+
+    # Data first and schema files after: the counters backfill in
+    # sql/001_task_counters.sql is much cheaper than the trigger per row
+    with open(os.path.join(SQL_DIR, '000_base_schema.sql')) as f:
+        await conn.execute(f.read().replace(' CONCURRENTLY', ''))
+    await conn.execute(SEED_USERS_QUERY, users)
+    await conn.execute(SEED_TASKS_QUERY, users, per_user)
+    await apply_schema(conn)
+
+    # Archived ids sit above every live task id
+    max_task_id = await conn.fetchval('SELECT MAX(task_id) FROM tasks')
+    await conn.execute(SEED_ARCHIVE_QUERY, users, per_user, max_task_id)
+    await conn.execute(SEED_OTPS_QUERY)
+
+    # Fresh statistics and visibility map, as autovacuum would leave them
+    for table in ('users', 'tasks', 'tasks_archive', 'validate_otp', 'task_counters', 'task_reminders'):
+        await conn.execute(f'VACUUM ANALYZE "{schema}".{table}')
+
+    logging.info(f"Seeded {users} users with {per_user} tasks each into schema {schema}")
+
+
+async def pick_sample(conn):
+    user_id = config.PLAN_CHECK_USERS // 2
+    task_ids = [
+        row['task_id'] for row in
+        await conn.fetch('SELECT task_id FROM tasks WHERE user_id = $1 ORDER BY task_id LIMIT 20', user_id)
+    ]
+    user = await conn.fetchrow('SELECT mobile_no, email FROM users WHERE user_id = $1', user_id)
+    return {
+        'user_id'   : user_id,
+        'task_id'   : task_ids[0],
+        'task_ids'  : task_ids,
+        'mobile'    : user['mobile_no'],
+        'email'     : user['email']
+    }
+
+
+async def run(dsn):
+    """Seed, explain every statement and return the list of failures."""
+    conn = await asyncpg.connect(dsn, server_settings={'search_path': config.PLAN_CHECK_SCHEMA})
+    failures = []
+    try:
+        await seed(conn)
+        statements = await collect_statements(await pick_sample(conn))
+
+        for name, query, params, budget in statements:
+            plan = await explain(conn, query, params)
+            problems = check_plan(plan, budget)
+            print(f"{'FAIL' if problems else 'ok':4} {shared_buffers(plan):>7} buffers {plan['Execution Time']:>9.2f} ms  {name}")
+            for problem in problems:
+                print(f"       {problem}")
+            if problems:
+                failures.append((name, problems, plan))
+    finally:
+        await conn.execute(f'DROP SCHEMA IF EXISTS "{config.PLAN_CHECK_SCHEMA}" CASCADE')
+        await conn.close()
+
+    print(f"{len(statements) - len(failures)} of {len(statements)} statements passed")
+    return failures
+
+
+async def list_statements():
+    sample = {'user_id': 1, 'task_id': 1, 'task_ids': [1, 2], 'mobile': '6000000001', 'email': 'user1@example.com'}
+    for name, query, params, budget in await collect_statements(sample):
+        print(f"-- {name}\n{' '.join(query.split())}\n")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    if '--list' in sys.argv[1:]:
+        asyncio.run(list_statements())
+        sys.exit(0)
+
+    if not config.PLAN_CHECK_DSN:
+        sys.exit("Set PLAN_CHECK_DSN to a local database to run the plan check")
+
+    failures = asyncio.run(run(config.PLAN_CHECK_DSN))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,199 @@
+import asyncio
+import datetime as dt
+import heapq
+import logging
+import config
+from leader import build_leader_lock
+from storage import storage
+from task_feed import task_feed
+
+
+class LoggingReminderSink:
+    """Default sink; swap in anything with an async emit(reminder)."""
+
+    async def emit(self, reminder):
+        logging.info(f"Reminder: task {reminder['task_id']} of user {reminder['user_id']} is due {reminder['due_date']}")
+
+
+class ReminderScheduler:
+    """
+    Fires a reminder REMINDER_LEAD_HOURS before each open task's due date.
+
+    The leader keeps the tasks due within the horizon in a heap ordered by
+    fire time. The heap is loaded in batches through the due_date index and
+    then kept current from task change events, so the tasks table is only
+    read again on the periodic refresh that slides the horizon forward.
+    Entries are invalidated lazily: `_due` holds each task's current due
+    date and heap entries that no longer match it are skipped when popped.
+    """
+
+    def __init__(self, sink, leader_lock):
+        self.sink = sink
+        self.leader_lock = leader_lock
+        self.is_leader = False
+        self._heap = []          # (fire_at, task_id, due_date, user_id)
+        self._due = {}           # task_id -> due_date currently scheduled
+        self._touched = None     # task ids changed by events during a reload
+        self._loaded_at = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def fire_at(self, due_date):
+        return dt.datetime.combine(due_date, dt.time.min) - dt.timedelta(hours=config.REMINDER_LEAD_HOURS)
+
+    def horizon(self):
+        today = dt.date.today()
+        return today, today + dt.timedelta(days=config.REMINDER_HORIZON_DAYS)
+
+    def schedule(self, task_id, user_id, due_date):
+        start, end = self.horizon()
+        if due_date is None or not start <= due_date <= end:
+            self.forget(task_id)
+            return
+
+        if self._due.get(task_id) == due_date:
+            return
+        self._due[task_id] = due_date
+
+        entry = (self.fire_at(due_date), task_id, due_date, user_id)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def forget(self, task_id):
+        self._due.pop(task_id, None)
+
+    def on_task_event(self, event):
+        if not self.is_leader:
+            return
+
+        if event['op'] == 'resync':
+            # Events were missed, rebuild from the table on the next pass
+            self._loaded_at = None
+            self._wakeup.set()
+            return
+
+        task_id = event.get('task_id')
+        if task_id is None:
+            return
+        if self._touched is not None:
+            self._touched.add(task_id)
+
+        if event['op'] in ('delete', 'archive') or event.get('status') == 'Done':
+            self.forget(task_id)
+        else:
+            due_date = event.get('due_date')
+            self.schedule(task_id, event['user_id'], dt.date.fromisoformat(due_date) if due_date else None)
+
+    async def reload(self):
+        start, end = self.horizon()
+        self._heap = []
+        self._due = {}
+        self._touched = set()
+        try:
+            after = (start, 0)
+            loaded = 0
+            while True:
+                rows = await storage.tasks.upcoming_due(start, end, after, config.REMINDER_BATCH_SIZE)
+                if rows is None:
+                    raise RuntimeError("loading upcoming due dates failed")
+
+                for row in rows:
+                    # An event seen since the reload began is newer than this row
+                    if row['task_id'] not in self._touched:
+                        self.schedule(row['task_id'], row['user_id'], row['due_date'])
+                loaded += len(rows)
+
+                if len(rows) < config.REMINDER_BATCH_SIZE:
+                    break
+                after = (rows[-1]['due_date'], rows[-1]['task_id'])
+        finally:
+            self._touched = None
+
+        self._loaded_at = dt.datetime.now()
+        logging.info(f"Reminder scheduler loaded {loaded} tasks due {start} to {end}")
+
+    async def fire_due(self):
+        now = dt.datetime.now()
+        fired = 0
+        retries = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, task_id, due_date, user_id = heapq.heappop(self._heap)
+            if self._due.get(task_id) != due_date:
+                continue  # superseded or forgotten
+            del self._due[task_id]
+
+            # The claim makes firing idempotent across leader changes
+            if not await storage.tasks.claim_reminder(task_id, due_date):
+                continue
+            try:
+                await self.sink.emit({'task_id': task_id, 'user_id': user_id, 'due_date': due_date.isoformat()})
+            except Exception as e:
+                # Unclaimed and put back, so it is retried rather than lost
+                logging.error(f"Reminder for task {task_id} could not be delivered: {e}")
+                await storage.tasks.release_reminder(task_id, due_date)
+                retries.append((task_id, due_date, user_id))
+                continue
+            fired += 1
+
+        # Pushed after the loop so a failing sink is not retried within this pass
+        retry_at = now + dt.timedelta(seconds=config.REMINDER_LEADER_RETRY_SECONDS)
+        for task_id, due_date, user_id in retries:
+            if task_id not in self._due:
+                self._due[task_id] = due_date
+                heapq.heappush(self._heap, (retry_at, task_id, due_date, user_id))
+        return fired
+
+    async def _sleep_until_next(self):
+        timeout = config.REMINDER_LEADER_RETRY_SECONDS
+        if self._heap:
+            timeout = min(timeout, max((self._heap[0][0] - dt.datetime.now()).total_seconds(), 0))
+
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        while True:
+            try:
+                self.is_leader = await self.leader_lock.ensure()
+                if not self.is_leader:
+                    self._heap, self._due, self._loaded_at = [], {}, None
+                    await asyncio.sleep(config.REMINDER_LEADER_RETRY_SECONDS)
+                    continue
+
+                stale = self._loaded_at is None or \
+                    (dt.datetime.now() - self._loaded_at).total_seconds() > config.REMINDER_REFRESH_SECONDS
+                if stale:
+                    await self.reload()
+
+                await self.fire_due()
+                await self._sleep_until_next()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error in reminder scheduler: {e}")
+                self._loaded_at = None
+                await asyncio.sleep(config.REMINDER_LEADER_RETRY_SECONDS)
+
+    async def start(self):
+        if self._task is None:
+            task_feed.add_callback(self.on_task_event)
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.is_leader = False
+        await self.leader_lock.release()
+
+
+reminder_scheduler = ReminderScheduler(LoggingReminderSink(), build_leader_lock(config.REMINDER_LOCK_KEY))
@@ -1,10 +1,15 @@
-from database import execute_query
+from database import coalescing_stats, DatabaseUnavailableError
 import logging
-from helpers import jwt_verifier, hash_password, build_response, extract_payload_data, validate_otp, get_user_data, prepare_response_data, extract_form_data, check_for_duplicate_keys, validate_data, otp_util
+from helpers import jwt_verifier, hash_password, build_response, extract_payload_data, validate_otp, get_user_data, prepare_response_data, extract_form_data, check_for_duplicate_keys, validate_data, otp_util, run_while_connected, ClientDisconnectedError, parse_task_fields, serialize_tasks, parse_task_ids
 from validation_strings import message_strings
 import datetime as dt
 import json
-
+import config
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from task_feed import task_feed
+from otp_delivery import otp_outbox
+from storage import storage, UPDATABLE_TASK_FIELDS, TASK_ORDER_COLUMNS, TASK_COLUMNS, EXPORT_FORMATS
 
 
 # user registration
@@ -29,8 +34,8 @@ async def user_registration_logic(request):
             )
 
         # Check if the user already exists
-        existing_user_check = await execute_query(
-            "SELECT user_id FROM users WHERE mobile_no = $1 or email = $2", (mobile, email,), flag="get"
+        existing_user_check = await storage.users.find_by_mobile_or_email(
+            mobile, email, timeout=config.STATEMENT_TIMEOUTS['auth']
         )
 
         if existing_user_check:
@@ -44,13 +49,8 @@ async def user_registration_logic(request):
         hashed_password = hash_password(password)
 
         # Insert the new user into the database
-        insert_user_query = """
-            INSERT INTO users (username, email, password_hash, mobile_no) 
-            VALUES ($1, $2, $3, $4) 
-            RETURNING user_id
-        """
-        new_user = await execute_query(
-            insert_user_query, params=(username, email, hashed_password, mobile,), flag="insert"
+        new_user = await storage.users.create(
+            username, email, hashed_password, mobile, timeout=config.STATEMENT_TIMEOUTS['auth']
         )
 
         if not new_user:
@@ -79,6 +79,9 @@ async def user_registration_logic(request):
                     status_code=200,    
                 )
 
+    except DatabaseUnavailableError:
+        raise
+
     except Exception as e:
         logging.error(f"Unexpected error in user_registration_logic: {e}")
         return await build_response(
@@ -99,15 +102,24 @@ async def list_tasks_logic(request):
 
         payload = request.query_params
         status = payload.get('status')
-        
-        logging.info(f"User ID: {user_id}, Status filter: {status}")
+        include_archived = payload.get('include_archived', '').lower() in ('1', 'true', 'yes')
 
-        query = "SELECT * FROM tasks where user_id = $1 "
-        if status:
-            query += "and status = $2"
-            tasks = await execute_query(query, params=(user_id,status,), flag="get")
-        else:
-            tasks = await execute_query(query, (user_id,), flag="get")
+        fields, invalid_fields = await parse_task_fields(payload.get('fields'))
+        if invalid_fields:
+            return await build_response(
+                message=f"Invalid fields {', '.join(invalid_fields)}. Allowed fields are {', '.join(TASK_COLUMNS)}.",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        logging.info(f"User ID: {user_id}, Status filter: {status}, Include archived: {include_archived}, Fields: {fields}")
+
+        tasks = await run_while_connected(
+            request, storage.tasks.list_for_user(
+                user_id, status=status, include_archived=include_archived, fields=fields,
+                timeout=config.STATEMENT_TIMEOUTS['list_tasks']
+            )
+        )
 
         if not tasks:
             return await build_response(
@@ -116,11 +128,7 @@ async def list_tasks_logic(request):
                 status_code=404
             )
 
-        serialized_data = [
-                {key: (value.isoformat() if isinstance(value, dt.datetime) else value)
-                for key, value in item.items()}
-                for item in tasks
-            ]
+        serialized_data = await serialize_tasks(tasks)
         
         logging.info(f"Tasks retrieved: {tasks}")
         return await build_response(
@@ -129,6 +137,16 @@ async def list_tasks_logic(request):
             data= serialized_data,
             status_code=200
         )
+    except ClientDisconnectedError:
+        return await build_response(
+            message=message_strings['client_closed'],
+            status=message_strings["status_0"],
+            status_code=499
+        )
+
+    except DatabaseUnavailableError:
+        raise
+
     except Exception as e:
         logging.error(f"Unexpected error in list_tasks_logic: {e}")
         return await build_response(
@@ -138,6 +156,108 @@ async def list_tasks_logic(request):
         )
 
 
+# batch fetch tasks by id
+async def batch_tasks_logic(request):
+    logging.info("Received request to fetch tasks by id")
+
+    try:
+        user_id = await jwt_verifier(request)
+        if isinstance(user_id, tuple):
+            return user_id
+
+        payload = request.query_params
+        task_ids = await parse_task_ids(payload.getlist('task_ids'), config.TASK_BATCH_LIMIT)
+        include_archived = payload.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+        if task_ids is None:
+            return await build_response(
+                message="Invalid task ids",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        if not task_ids:
+            return await build_response(
+                message="task_ids is required",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        if len(task_ids) > config.TASK_BATCH_LIMIT:
+            return await build_response(
+                message=f"At most {config.TASK_BATCH_LIMIT} task ids can be fetched at once",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        fields, invalid_fields = await parse_task_fields(payload.get('fields'))
+        if invalid_fields:
+            return await build_response(
+                message=f"Invalid fields {', '.join(invalid_fields)}. Allowed fields are {', '.join(TASK_COLUMNS)}.",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        # task_id is needed to match rows to the request even when not asked for
+        query_fields = fields if fields is None or 'task_id' in fields else ['task_id'] + fields
+
+        tasks = await run_while_connected(
+            request, storage.tasks.get_many(
+                user_id, task_ids, include_archived=include_archived, fields=query_fields,
+                timeout=config.STATEMENT_TIMEOUTS['batch_tasks']
+            )
+        )
+
+        if tasks is None:
+            return await build_response(
+                message="Tasks could not be loaded",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        # Answer in request order and report the ids that were not found
+        by_id = {task['task_id']: task for task in tasks}
+        found = [by_id[task_id] for task_id in task_ids if task_id in by_id]
+        missing = [task_id for task_id in task_ids if task_id not in by_id]
+        if query_fields is not fields:
+            for task in found:
+                del task['task_id']
+
+        if not found:
+            return await build_response(
+                message="No tasks found",
+                status=message_strings["status_0"],
+                data={'tasks': [], 'missing': missing},
+                status_code=404
+            )
+
+        logging.info(f"Tasks fetched for user {user_id}: {len(found)} found, {len(missing)} missing")
+        return await build_response(
+            message="Tasks retrieved successfully",
+            status=message_strings["status_1"],
+            data={'tasks': await serialize_tasks(found), 'missing': missing},
+            status_code=200
+        )
+
+    except ClientDisconnectedError:
+        return await build_response(
+            message=message_strings['client_closed'],
+            status=message_strings["status_0"],
+            status_code=499
+        )
+
+    except DatabaseUnavailableError:
+        raise
+
+    except Exception as e:
+        logging.error(f"Unexpected error in batch_tasks_logic: {e}")
+        return await build_response(
+            message=message_strings['internal_error'],
+            status=message_strings["status_0"],
+            status_code=400
+        )
+
+
 # create task
 async def create_task_logic(request):
     logging.info("Received request to create a new task")
@@ -181,12 +301,9 @@ async def create_task_logic(request):
                 status_code = 400
             )
         
-        query = """
-            INSERT INTO tasks (title, description, status, due_date, created_at, updated_at, user_id)
-            VALUES ($1, $2, $3, $4, NOW(), NOW(), $5)
-            RETURNING task_id
-        """
-        task_id = await execute_query(query, params=(title, description, status, due_date, user_id), flag="insert")
+        task_id = await storage.tasks.create(
+            user_id, title, description, status, due_date, timeout=config.STATEMENT_TIMEOUTS['write_task']
+        )
         
         if not task_id:
             return await build_response(
@@ -202,6 +319,9 @@ async def create_task_logic(request):
             data={"task_id": task_id.get("task_id")},
             status_code=201
         )
+    except DatabaseUnavailableError:
+        raise
+
     except Exception as e:
         logging.error(f"Unexpected error in create_task_logic: {e}")
         return await build_response(
@@ -253,11 +373,17 @@ async def update_task_logic(request):
                 status_code=400
             )
 
-        set_clause = ", ".join([f"{key} = ${i+4}" for i, key in enumerate(fields_to_update.keys())])
-        query = f"UPDATE tasks SET {set_clause}, due_date = $3, updated_at = NOW() WHERE task_id = $1 and user_id = $2 RETURNING task_id"
+        invalid_fields = [key for key in fields_to_update if key not in UPDATABLE_TASK_FIELDS]
+        if invalid_fields:
+            return await build_response(
+                message=f"Invalid fields {', '.join(invalid_fields)}. Allowed fields are {', '.join(UPDATABLE_TASK_FIELDS)}.",
+                status=message_strings["status_0"],
+                status_code=400
+            )
 
-        params = [task_id, user_id, due_date] + list(fields_to_update.values())
-        result = await execute_query(query, params=tuple(params), flag="update")
+        result = await storage.tasks.update(
+            user_id, task_id, due_date, fields_to_update, timeout=config.STATEMENT_TIMEOUTS['write_task']
+        )
 
         if not result:
             return await build_response(
@@ -273,6 +399,9 @@ async def update_task_logic(request):
             data={"task_id": result.get("task_id")},
             status_code=200
         )
+    except DatabaseUnavailableError:
+        raise
+
     except Exception as e:
         logging.error(f"Unexpected error in update_task_logic: {e}")
         return await build_response(
@@ -313,8 +442,7 @@ async def delete_task_logic(request):
                 status_code=400
             )
 
-        query = "DELETE FROM tasks WHERE task_id = $1 and user_id = $2 RETURNING task_id"
-        result = await execute_query(query, params=(task_id, user_id,), flag="delete")
+        result = await storage.tasks.delete(user_id, task_id, timeout=config.STATEMENT_TIMEOUTS['write_task'])
 
         if not result:
             return await build_response(
@@ -330,6 +458,9 @@ async def delete_task_logic(request):
             data={"task_id": result.get("task_id")},
             status_code=200
         )
+    except DatabaseUnavailableError:
+        raise
+
     except Exception as e:
         logging.error(f"Unexpected error in delete_task_logic: {e}")
         return await build_response(
@@ -353,20 +484,27 @@ async def order_tasks_logic(request):
         order_by = payload.get('order_by', 'created_at')  # Default to 'created_at'
 
         # Validate the order_by value
-        if order_by not in ['created_at', 'due_date']:
+        if order_by not in TASK_ORDER_COLUMNS:
             return await build_response(
                 message="Invalid order_by value. Allowed values are 'created_at' or 'due_date'.",
                 status=message_strings["status_0"],
                 status_code=400
             )
 
-        # Query to get the current list of tasks ordered by the chosen column
-        query = f"""
-            SELECT * FROM tasks 
-            WHERE user_id = $1 AND status != $2 
-            ORDER BY {order_by} ASC
-        """
-        current_tasks = await execute_query(query, (user_id, 'Done',), flag="get")
+        fields, invalid_fields = await parse_task_fields(request.query_params.get('fields'))
+        if invalid_fields:
+            return await build_response(
+                message=f"Invalid fields {', '.join(invalid_fields)}. Allowed fields are {', '.join(TASK_COLUMNS)}.",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        # Get the current (not Done) tasks ordered by the chosen column
+        current_tasks = await run_while_connected(
+            request, storage.tasks.list_open_ordered(
+                user_id, order_by, fields=fields, timeout=config.STATEMENT_TIMEOUTS['order_tasks']
+            )
+        )
 
         # Check if tasks exist
         if not current_tasks:
@@ -376,12 +514,8 @@ async def order_tasks_logic(request):
                 status_code=404
             )
 
-        # Serialize datetime objects in the retrieved tasks
-        serialized_data = [
-            {key: (value.isoformat() if isinstance(value, dt.datetime) else value)
-             for key, value in item.items()}
-            for item in current_tasks
-        ]
+        # Serialize date and datetime objects in the retrieved tasks
+        serialized_data = await serialize_tasks(current_tasks)
 
         logging.info("Tasks retrieved successfully")
         return await build_response(
@@ -391,6 +525,16 @@ async def order_tasks_logic(request):
             status_code=200
         )
 
+    except ClientDisconnectedError:
+        return await build_response(
+            message=message_strings['client_closed'],
+            status=message_strings["status_0"],
+            status_code=499
+        )
+
+    except DatabaseUnavailableError:
+        raise
+
     except Exception as e:
         logging.error(f"Unexpected error in order_tasks_logic: {e}")
         return await build_response(
@@ -400,6 +544,173 @@ async def order_tasks_logic(request):
         )
 
 
+# task summary
+async def task_summary_logic(request):
+    logging.info("Received request for task summary")
+
+    try:
+        user_id = await jwt_verifier(request)
+        if isinstance(user_id, tuple):
+            return user_id
+
+        counters = await storage.tasks.summary_counters(
+            user_id, config.DUE_SOON_DAYS, timeout=config.STATEMENT_TIMEOUTS['task_summary']
+        )
+
+        if counters is None:
+            return await build_response(
+                message="Task summary could not be loaded",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        summary = {
+            'by_status'     : {},
+            'total'         : 0,
+            'overdue'       : 0,
+            'due_soon'      : 0,
+            'due_soon_days' : config.DUE_SOON_DAYS
+        }
+        for row in counters:
+            summary['by_status'][row['status']] = row['total']
+            summary['total'] += row['total']
+
+            # Finished tasks are never overdue or due soon
+            if row['status'] != 'Done':
+                summary['overdue'] += row['overdue']
+                summary['due_soon'] += row['due_soon']
+
+        logging.info(f"Task summary for user {user_id}: {summary}")
+        return await build_response(
+            message="Task summary retrieved successfully",
+            status=message_strings["status_1"],
+            data=summary,
+            status_code=200
+        )
+
+    except DatabaseUnavailableError:
+        raise
+
+    except Exception as e:
+        logging.error(f"Unexpected error in task_summary_logic: {e}")
+        return await build_response(
+            message=message_strings['internal_error'],
+            status=message_strings["status_0"],
+            status_code=400
+        )
+
+
+
+# live task feed
+async def task_feed_logic(request):
+    logging.info("Received request to subscribe to the task feed")
+
+    try:
+        user_id = await jwt_verifier(request)
+        if isinstance(user_id, tuple):
+            return user_id
+
+        return StreamingResponse(
+            task_feed.stream(user_id),
+            media_type="text/event-stream",
+            headers={
+                'Cache-Control'     : 'no-cache',
+                'X-Accel-Buffering' : 'no'
+            }
+        )
+
+    except Exception as e:
+        logging.error(f"Unexpected error in task_feed_logic: {e}")
+        return await build_response(
+            message=message_strings['internal_error'],
+            status=message_strings["status_0"],
+            status_code=400
+        )
+
+
+# query metrics
+async def query_metrics_logic(request):
+    logging.info("Received request for query metrics")
+
+    try:
+        executed = coalescing_stats['executed']
+        coalesced = coalescing_stats['coalesced']
+        total = executed + coalesced
+
+        return await build_response(
+            message="Query metrics retrieved successfully",
+            status=message_strings["status_1"],
+            data={
+                'reads_executed'    : executed,
+                'reads_coalesced'   : coalesced,
+                'coalesced_ratio'   : round(coalesced / total, 4) if total else 0
+            },
+            status_code=200
+        )
+
+    except Exception as e:
+        logging.error(f"Unexpected error in query_metrics_logic: {e}")
+        return await build_response(
+            message=message_strings['internal_error'],
+            status=message_strings["status_0"],
+            status_code=400
+        )
+
+
+# export tasks
+async def export_tasks_logic(request):
+    logging.info("Received request to export tasks")
+
+    try:
+        user_id = await jwt_verifier(request)
+        if isinstance(user_id, tuple):
+            return user_id
+
+        payload = request.query_params
+        export_format = payload.get('format', 'csv').lower()
+        include_archived = payload.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+        if export_format not in EXPORT_FORMATS:
+            return await build_response(
+                message=f"Invalid format value. Allowed values are {', '.join(EXPORT_FORMATS)}.",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        fields, invalid_fields = await parse_task_fields(payload.get('fields'))
+        if invalid_fields:
+            return await build_response(
+                message=f"Invalid fields {', '.join(invalid_fields)}. Allowed fields are {', '.join(TASK_COLUMNS)}.",
+                status=message_strings["status_0"],
+                status_code=400
+            )
+
+        # Rows are streamed straight from COPY, never materialized here
+        chunks = await storage.tasks.export_for_user(
+            user_id, export_format, include_archived=include_archived, fields=fields,
+            timeout=config.STATEMENT_TIMEOUTS['export']
+        )
+
+        logging.info(f"Exporting tasks for user {user_id} as {export_format}")
+        return StreamingResponse(
+            chunks,
+            media_type=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename="tasks.{export_format}"'},
+            # Runs even when the response is cancelled before the body is read
+            background=BackgroundTask(chunks.aclose)
+        )
+
+    except DatabaseUnavailableError:
+        raise
+
+    except Exception as e:
+        logging.error(f"Unexpected error in export_tasks_logic: {e}")
+        return await build_response(
+            message=message_strings['internal_error'],
+            status=message_strings["status_0"],
+            status_code=400
+        )
+
     
 # verify otp logic
 async def verify_otp_logic(request):
@@ -443,6 +754,9 @@ async def verify_otp_logic(request):
             data= responsedata
         )
     
+    except DatabaseUnavailableError:
+        raise
+
     except Exception as e:
         logging.error(f"Error at verify_otp: {str(e)}")
         return await build_response(message=str(e), status=False, status_code=400)
@@ -481,11 +795,7 @@ async def generate_otp_logic(request=None, data=None):
         mobile_no = data.get('mobile_no')
 
         # Check if the user exists in the 'user' table
-        validate_user_query = """
-            SELECT user_id FROM users WHERE mobile_no = $1
-        """
-        validate_user_params = (mobile_no,)
-        user_exists = await execute_query(query=validate_user_query, params=validate_user_params, flag='get')
+        user_exists = await storage.users.find_by_mobile(mobile_no, timeout=config.STATEMENT_TIMEOUTS['auth'])
 
         if not user_exists:
             # User does not exist, return is_registered = 0
@@ -502,16 +812,11 @@ async def generate_otp_logic(request=None, data=None):
         create_date = dt.datetime.now()
         update_date = dt.datetime.now()
 
-        # Check if a record exists in the validate_otp table
-        validation_query = """
-            INSERT INTO validate_otp (mobile, otp, created, updated)
-            VALUES ($1, $2, $3, $4)
-            ON CONFLICT (mobile)
-            DO UPDATE SET otp = EXCLUDED.otp, updated = EXCLUDED.updated
-            RETURNING id
-        """
-        query_params = (mobile_no, otp, create_date, update_date)
-        await execute_query(query=validation_query, params=query_params, flag='insert')
+        # Insert or refresh the record in the validate_otp table
+        await storage.otps.upsert(mobile_no, otp, create_date, update_date, timeout=config.STATEMENT_TIMEOUTS['auth'])
+
+        # Delivery happens in the OTP worker, the request only waits for the enqueue
+        await otp_outbox.publish(mobile_no, otp)
 
         return await build_response(
             message="OTP sent successfully",
@@ -520,6 +825,9 @@ async def generate_otp_logic(request=None, data=None):
             data = {'otp' : otp}
         )
 
+    except DatabaseUnavailableError:
+        raise
+
     except Exception as e:
         logging.error(f"Error in generate_otp_logic: {str(e)}")
         return await build_response(message=str(e), status=message_strings['status_0'], status_code=400)
\ No newline at end of file
@@ -0,0 +1,35 @@
+-- Base tables.
+--
+-- The tables the service was first written against, as documented under
+-- "Database Schema" in the README. Everything is IF NOT EXISTS, so this is a
+-- no-op on an existing database and sets up a fresh one (including the
+-- scratch schema plan_check.py seeds).
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id         SERIAL PRIMARY KEY,
+    username        TEXT,
+    password_hash   TEXT,
+    created_at      TIMESTAMP DEFAULT NOW(),
+    updated_at      TIMESTAMP DEFAULT NOW(),
+    mobile_no       TEXT,
+    email           TEXT
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id         SERIAL PRIMARY KEY,
+    title           TEXT,
+    description     TEXT,
+    status          TEXT,
+    due_date        DATE,
+    created_at      TIMESTAMP,
+    updated_at      TIMESTAMP,
+    user_id         INTEGER REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS validate_otp (
+    id              SERIAL PRIMARY KEY,
+    mobile          TEXT UNIQUE,
+    otp             TEXT,
+    created         TIMESTAMP,
+    updated         TIMESTAMP
+);
@@ -0,0 +1,128 @@
+-- Per-user task counters for the summary endpoint.
+--
+-- One row per (user_id, status, due_date) holding the number of tasks in that
+-- bucket. The trigger keeps the table in step with every INSERT, UPDATE and
+-- DELETE on tasks inside the same transaction, so dashboard reads never have
+-- to scan the tasks table.
+--
+-- Done tasks are never overdue or due soon, so they all share the 'infinity'
+-- bucket with the tasks that have no due date. A user's row count is then
+-- bounded by their open due dates rather than growing with their history.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS task_counters (
+    user_id     INTEGER NOT NULL,
+    status      TEXT    NOT NULL,
+    due_date    DATE    NOT NULL,
+    task_count  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, status, due_date)
+);
+
+-- The due_date bucket a task is counted under
+CREATE OR REPLACE FUNCTION task_counter_due_date(status TEXT, due_date DATE) RETURNS DATE AS $$
+    SELECT CASE WHEN status = 'Done' THEN 'infinity'::date ELSE COALESCE(due_date, 'infinity') END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Adds delta to one bucket, dropping the row when it reaches zero
+CREATE OR REPLACE FUNCTION add_task_count(bucket_user_id INTEGER, bucket_status TEXT, bucket_due_date DATE, delta INTEGER)
+RETURNS void AS $$
+BEGIN
+    IF delta > 0 THEN
+        INSERT INTO task_counters (user_id, status, due_date, task_count)
+        VALUES (bucket_user_id, bucket_status, bucket_due_date, delta)
+        ON CONFLICT (user_id, status, due_date)
+        DO UPDATE SET task_count = task_counters.task_count + delta;
+    ELSE
+        UPDATE task_counters
+           SET task_count = task_count + delta
+         WHERE user_id = bucket_user_id AND status = bucket_status AND due_date = bucket_due_date;
+
+        DELETE FROM task_counters
+         WHERE user_id = bucket_user_id AND status = bucket_status AND due_date = bucket_due_date
+           AND task_count <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_task_counters() RETURNS trigger AS $$
+DECLARE
+    old_status      TEXT;
+    old_due_date    DATE;
+    new_status      TEXT;
+    new_due_date    DATE;
+BEGIN
+    -- The archiver moves tasks to tasks_archive, where they stay counted,
+    -- so its DELETE leaves the counters alone (see pg_storage.archive_done)
+    IF current_setting('avrio.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        PERFORM add_task_count(NEW.user_id, COALESCE(NEW.status, ''), task_counter_due_date(NEW.status, NEW.due_date), 1);
+        RETURN NULL;
+    END IF;
+
+    old_status := COALESCE(OLD.status, '');
+    old_due_date := task_counter_due_date(OLD.status, OLD.due_date);
+    IF TG_OP = 'DELETE' THEN
+        PERFORM add_task_count(OLD.user_id, old_status, old_due_date, -1);
+        RETURN NULL;
+    END IF;
+
+    new_status := COALESCE(NEW.status, '');
+    new_due_date := task_counter_due_date(NEW.status, NEW.due_date);
+
+    -- Nothing to do when an update leaves the task in the same bucket
+    IF (OLD.user_id, old_status, old_due_date) = (NEW.user_id, new_status, new_due_date) THEN
+        RETURN NULL;
+    END IF;
+
+    -- Touch the two rows in key order, so concurrent moves between the same
+    -- two buckets in opposite directions lock them in the same order and
+    -- cannot deadlock
+    IF (OLD.user_id, old_status, old_due_date) < (NEW.user_id, new_status, new_due_date) THEN
+        PERFORM add_task_count(OLD.user_id, old_status, old_due_date, -1);
+        PERFORM add_task_count(NEW.user_id, new_status, new_due_date, 1);
+    ELSE
+        PERFORM add_task_count(NEW.user_id, new_status, new_due_date, 1);
+        PERFORM add_task_count(OLD.user_id, old_status, old_due_date, -1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_counters ON tasks;
+CREATE TRIGGER tasks_counters
+    AFTER INSERT OR UPDATE OF user_id, status, due_date OR DELETE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION bump_task_counters();
+
+-- Backfill from the existing rows; the lock keeps writers out until the
+-- trigger and the counters agree.
+LOCK TABLE tasks IN SHARE ROW EXCLUSIVE MODE;
+
+TRUNCATE task_counters;
+INSERT INTO task_counters (user_id, status, due_date, task_count)
+SELECT user_id, COALESCE(status, ''), task_counter_due_date(status, due_date), COUNT(*)
+  FROM tasks
+ GROUP BY 1, 2, 3;
+
+-- Archived tasks stay counted (sql/003_tasks_archive.sql), so a re-run must
+-- count them too. The table only exists once 003 has been applied.
+DO $$
+BEGIN
+    IF to_regclass('tasks_archive') IS NOT NULL THEN
+        EXECUTE $backfill$
+            INSERT INTO task_counters (user_id, status, due_date, task_count)
+            SELECT user_id, COALESCE(status, ''), task_counter_due_date(status, due_date), COUNT(*)
+              FROM tasks_archive
+             GROUP BY 1, 2, 3
+            ON CONFLICT (user_id, status, due_date)
+            DO UPDATE SET task_count = task_counters.task_count + EXCLUDED.task_count
+        $backfill$;
+    END IF;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,45 @@
+-- Task change notifications for the live feed.
+--
+-- Every committed INSERT, UPDATE and DELETE on tasks publishes a small JSON
+-- payload on the task_changes channel. Each worker holds one LISTEN
+-- connection and fans the payloads out to its subscribers (see task_feed.py).
+-- NOTIFY is delivered on commit, so rolled back changes are never published.
+-- Tasks moved to tasks_archive by the archiver are published as 'archive'
+-- rather than 'delete'.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION notify_task_change() RETURNS trigger AS $$
+DECLARE
+    changed tasks%ROWTYPE;
+    op      TEXT := lower(TG_OP);
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+        IF current_setting('avrio.archiving', true) = 'on' THEN
+            op := 'archive';
+        END IF;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    -- Keep the payload well under the 8000 byte NOTIFY limit: clients
+    -- refetch the task if they need more than this
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op',       op,
+        'task_id',  changed.task_id,
+        'user_id',  changed.user_id,
+        'status',   changed.status,
+        'due_date', changed.due_date
+    )::text);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_notify ON tasks;
+CREATE TRIGGER tasks_notify
+    AFTER INSERT OR UPDATE OR DELETE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION notify_task_change();
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- Cold storage for finished tasks.
+--
+-- archiver.py moves Done tasks that have not been touched for
+-- ARCHIVE_AFTER_DAYS out of tasks and into tasks_archive in batches, keeping
+-- the hot table (and its indexes) down to the working set. The list endpoint
+-- only reads the archive when asked with include_archived.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS tasks_archive (LIKE tasks);
+ALTER TABLE tasks_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+CREATE UNIQUE INDEX IF NOT EXISTS tasks_archive_task_id_idx ON tasks_archive (task_id);
+CREATE INDEX IF NOT EXISTS tasks_archive_user_status_idx ON tasks_archive (user_id, status);
+
+-- Lets the archiver find candidates without scanning open tasks
+CREATE INDEX IF NOT EXISTS tasks_done_updated_at_idx ON tasks (updated_at) WHERE status = 'Done';
+
+-- Archived tasks stay in the summary counts: the archiver's DELETE from
+-- tasks skips the counter trigger (sql/001_task_counters.sql), so the move
+-- does not touch task_counters at all.
+
+COMMIT;
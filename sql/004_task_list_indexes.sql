@@ -0,0 +1,18 @@
+-- Covering indexes for narrow list views.
+--
+-- With fields=task_id,title,status,due_date the list and order endpoints only
+-- need columns held in these indexes, so Postgres can answer them with an
+-- index-only scan (given a reasonably fresh visibility map) instead of
+-- visiting the heap for every task.
+--
+-- CONCURRENTLY keeps writes flowing while the indexes build, so this file
+-- must not run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_user_status_cover_idx
+    ON tasks (user_id, status) INCLUDE (task_id, title, due_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_user_due_date_cover_idx
+    ON tasks (user_id, due_date) INCLUDE (task_id, title, status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_user_created_at_cover_idx
+    ON tasks (user_id, created_at) INCLUDE (task_id, title, status, due_date);
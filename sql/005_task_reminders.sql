@@ -0,0 +1,15 @@
+-- Due-date reminders.
+--
+-- The scheduler in reminders.py loads upcoming due dates in keyset-paginated
+-- batches through tasks_due_date_idx instead of scanning tasks. Each fired
+-- reminder is recorded in task_reminders, so a reminder fires once per task
+-- and due date even across leader changes.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tasks_due_date_idx ON tasks (due_date, task_id);
+
+CREATE TABLE IF NOT EXISTS task_reminders (
+    task_id     INTEGER   NOT NULL,
+    due_date    DATE      NOT NULL,
+    fired_at    TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (task_id, due_date)
+);
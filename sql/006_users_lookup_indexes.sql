@@ -0,0 +1,12 @@
+-- Indexes for the users lookups.
+--
+-- Registration checks for an existing user with `mobile_no = $1 or email = $2`
+-- and OTP verification looks users up by mobile_no. Without these indexes
+-- both read the whole users table on every request; with them the first is a
+-- BitmapOr of two index scans and the second a plain index scan.
+--
+-- CONCURRENTLY keeps registrations flowing while the indexes build, so this
+-- file must not run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_mobile_no_idx ON users (mobile_no);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_email_idx ON users (email);
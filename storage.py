@@ -0,0 +1,172 @@
+from abc import ABC, abstractmethod
+import config
+
+# Columns of the tasks table, shared with tasks_archive
+TASK_COLUMNS = ('task_id', 'title', 'description', 'status', 'due_date', 'created_at', 'updated_at', 'user_id')
+
+# Columns a client may change through update_task
+UPDATABLE_TASK_FIELDS = ('title', 'description', 'status')
+
+# Columns order_task may sort by
+TASK_ORDER_COLUMNS = ('created_at', 'due_date')
+
+# Formats export_task supports, with their media types
+EXPORT_FORMATS = {
+    'csv'       : 'text/csv',
+    'ndjson'    : 'application/x-ndjson'
+}
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    async def find_by_mobile_or_email(self, mobile, email, timeout=None):
+        """Return the matching users as a list of {'user_id'} dicts."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create(self, username, email, password_hash, mobile, timeout=None):
+        """Insert a user and return {'user_id'}, or None on failure."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_by_mobile(self, mobile, timeout=None):
+        """Return user_id, username, mobile_no and email of the matching users."""
+        raise NotImplementedError
+
+
+class OtpRepository(ABC):
+    @abstractmethod
+    async def upsert(self, mobile, otp, created, updated, timeout=None):
+        """Store the latest OTP for a mobile number and return {'id'}."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def is_valid(self, mobile, otp, timeout=None):
+        """Return True if `otp` is the latest OTP stored for the mobile number."""
+        raise NotImplementedError
+
+
+class TaskRepository(ABC):
+    @abstractmethod
+    async def list_for_user(self, user_id, status=None, include_archived=False, fields=None, timeout=None):
+        """
+        Return the user's tasks, optionally filtered by status. With
+        include_archived every row carries an 'archived' flag. `fields`
+        narrows each row to those TASK_COLUMNS (all columns when None).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def list_open_ordered(self, user_id, order_by, fields=None, timeout=None):
+        """Return the user's tasks that are not Done, ascending by order_by."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_many(self, user_id, task_ids, include_archived=False, fields=None, timeout=None):
+        """
+        Return those of `task_ids` that belong to the user, in no particular
+        order. Ids that do not exist or belong to someone else are left out,
+        as are archived tasks unless include_archived is set, in which case
+        every row carries an 'archived' flag.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create(self, user_id, title, description, status, due_date, timeout=None):
+        """Insert a task and return {'task_id'}, or None on failure."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update(self, user_id, task_id, due_date, fields, timeout=None):
+        """
+        Set due_date and the UPDATABLE_TASK_FIELDS in `fields` on one of the
+        user's tasks. Return {'task_id'}, or None if there is no such task.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, user_id, task_id, timeout=None):
+        """Delete one of the user's tasks. Return {'task_id'} or None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def export_for_user(self, user_id, fmt, include_archived=False, fields=None, timeout=None):
+        """
+        Start an export of the user's tasks in one of EXPORT_FORMATS and
+        return an async iterator of bytes chunks with an aclose() method.
+        Any resources the export needs are taken before returning, so
+        failures surface here rather than halfway through the stream, and
+        are only released by aclose() (or by iterating to the end).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upcoming_due(self, start, end, after, limit):
+        """
+        Return up to `limit` tasks that are not Done with start <= due_date
+        <= end and (due_date, task_id) > after, ordered by (due_date, task_id).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim_reminder(self, task_id, due_date):
+        """Record a reminder as fired. Return False if it already was."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def release_reminder(self, task_id, due_date):
+        """Undo claim_reminder for a reminder that could not be delivered."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def summary_counters(self, user_id, due_soon_days, timeout=None):
+        """
+        Return one row per status with 'status', 'total', 'overdue' and
+        'due_soon' counts.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def archive_done(self, after_days, batch_size):
+        """
+        Move up to batch_size Done tasks not updated for after_days into the
+        archive. Return the number of tasks moved.
+        """
+        raise NotImplementedError
+
+
+def check_task_fields(fields):
+    """Return `fields` as a tuple of task columns, or all columns for None."""
+    if fields is None:
+        return TASK_COLUMNS
+
+    invalid = set(fields) - set(TASK_COLUMNS)
+    if invalid:
+        raise ValueError(f"Invalid task columns {sorted(invalid)}")
+    return tuple(fields)
+
+
+class Storage:
+    def __init__(self, users, tasks, otps):
+        self.users = users
+        self.tasks = tasks
+        self.otps = otps
+
+
+def build_storage(backend=None):
+    backend = backend or config.STORAGE_BACKEND
+
+    # Backends are imported lazily, they import this module for the interfaces
+    if backend == 'memory':
+        from memory_storage import MemoryEngine, MemoryUserRepository, MemoryTaskRepository, MemoryOtpRepository
+        engine = MemoryEngine()
+        return Storage(MemoryUserRepository(engine), MemoryTaskRepository(engine), MemoryOtpRepository(engine))
+
+    if backend == 'postgres':
+        from pg_storage import PostgresUserRepository, PostgresTaskRepository, PostgresOtpRepository
+        return Storage(PostgresUserRepository(), PostgresTaskRepository(), PostgresOtpRepository())
+
+    raise ValueError(f"Unknown storage backend {backend!r}. Use 'postgres' or 'memory'.")
+
+
+storage = build_storage()
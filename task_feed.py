@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import asyncpg
+import config
+
+# Channel the tasks trigger publishes on (see sql/002_task_events.sql)
+CHANNEL = 'task_changes'
+
+
+class Subscription:
+    """
+    One connected feed client.
+
+    Events are buffered in a bounded queue. A subscriber that falls more than
+    FEED_BUFFER_SIZE events behind is not allowed to grow the buffer: its
+    backlog is dropped and replaced by a single 'resync' event, after which
+    the stream ends and the client is expected to refetch its task list.
+    """
+
+    def __init__(self, user_id, max_buffer):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=max_buffer)
+        self.overflowed = False
+
+    def offer(self, event):
+        if self.overflowed:
+            return
+
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.resync()
+
+    def resync(self):
+        self.overflowed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({'op': 'resync'})
+
+
+class TaskFeed:
+    """
+    Fans task change notifications out to the subscribers of this worker.
+
+    A single dedicated connection (outside the query pool) LISTENs on
+    CHANNEL, so the number of database connections does not grow with the
+    number of connected clients.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._callbacks = []    # in-process consumers of every event
+        self._listener = None
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, config.FEED_BUFFER_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        logging.info(f"Task feed subscriber added for user {user_id}")
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None:
+            return
+
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+        logging.info(f"Task feed subscriber removed for user {subscription.user_id}")
+
+    def add_callback(self, callback):
+        """Call `callback(event)` for every event, whatever its user."""
+        self._callbacks.append(callback)
+
+    def _run_callbacks(self, event):
+        for callback in self._callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                logging.error(f"Task feed callback failed for {event}: {e}")
+
+    def dispatch(self, event):
+        self._run_callbacks(event)
+        for subscription in list(self._subscribers.get(event.get('user_id'), ())):
+            subscription.offer(event)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError as e:
+            logging.error(f"Invalid task feed payload {payload!r}: {e}")
+            return
+        self.dispatch(event)
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(
+                    user= config.PG_USER,
+                    password= config.PG_PASSWORD,
+                    host= config.PG_HOST,
+                    port= config.PG_PORT,
+                    database= config.PG_NAME
+                )
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda c: closed.set())
+                await conn.add_listener(CHANNEL, self._on_notify)
+                logging.info(f"Task feed listening on {CHANNEL}")
+
+                await closed.wait()
+                logging.warning("Task feed listener connection lost")
+
+            except asyncio.CancelledError:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+                raise
+
+            except Exception as e:
+                logging.error(f"Task feed listener error: {e}")
+
+            # Notifications sent while we were disconnected are gone for good
+            self._run_callbacks({'op': 'resync'})
+            for subscribers in list(self._subscribers.values()):
+                for subscription in list(subscribers):
+                    subscription.resync()
+
+            await asyncio.sleep(config.FEED_RECONNECT_SECONDS)
+
+    async def stream(self, user_id):
+        """
+        Subscribe to the user's events and yield them as server-sent events
+        until the subscription ends. Subscribing here rather than before the
+        response starts means a response cancelled before its body is read
+        never leaves a subscription behind.
+        """
+        subscription = self.subscribe(user_id)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=config.FEED_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield f"event: {event['op']}\ndata: {json.dumps(event)}\n\n"
+                if event['op'] == 'resync':
+                    break
+        finally:
+            self.unsubscribe(subscription)
+
+
+# One feed per worker process
+task_feed = TaskFeed()
@@ -4,5 +4,7 @@ message_strings = {
     'status_1'            : True,
     'internal_error'      : 'internal server error',
     'mobile_empty'        : "Mobile number cannot be empty",
-    'otp_empty'           : "otp cannot be empty"
+    'otp_empty'           : "otp cannot be empty",
+    'service_unavailable' : 'service is busy, please retry',
+    'client_closed'       : 'client closed request'
 }
\ No newline at end of file